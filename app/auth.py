@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+
+from . import crud
+from .cache import owner_cache
+from .config import TOKEN_SECRET, TOKEN_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+if TOKEN_SECRET:
+    _secret = TOKEN_SECRET.encode()
+else:
+    logger.warning("PORTFOLIO_TOKEN_SECRET is not set; tokens will not survive a restart")
+    _secret = secrets.token_bytes(32)
+
+_header = {"alg": "HS256", "typ": "JWT"}
+
+security_detail = OAuth2PasswordBearer(tokenUrl="login")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(signing_input):
+    return hmac.new(_secret, signing_input.encode(), hashlib.sha256).digest()
+
+
+def create_access_token(owner):
+    now = int(time.time())
+    claims = {"sub": owner.username, "uid": owner.id, "iat": now, "exp": now + TOKEN_TTL_SECONDS}
+    signing_input = ".".join(_b64encode(json.dumps(part, separators=(",", ":")).encode())
+                             for part in (_header, claims))
+    return signing_input + "." + _b64encode(_sign(signing_input))
+
+
+def decode_access_token(token):
+    """Verify a token's signature and expiry in memory and return its claims."""
+    try:
+        header, payload, signature = token.split(".")
+        if not hmac.compare_digest(_b64decode(signature), _sign(header + "." + payload)):
+            raise InvalidToken("Bad signature")
+        if json.loads(_b64decode(header)).get("alg") != "HS256":
+            raise InvalidToken("Unsupported algorithm")
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError) as e:
+        raise InvalidToken(str(e))
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("Token expired")
+    return claims
+
+
+def credentials_error():
+    return HTTPException(status_code=401, detail="Invalid credentials",
+                         headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_owner(token = Depends(security_detail)):
+    """Dependency for endpoints that only need a valid token; no database access."""
+    try:
+        return decode_access_token(token)
+    except InvalidToken:
+        raise credentials_error()
+
+
+def get_cached_owner(session, username):
+    owner = owner_cache.get(username)
+    if owner is None:
+        row = crud.get_owner_by_username(session, username)
+        if row is None:
+            return None
+        owner = {"id": row.id, "username": row.username, "email": row.email}
+        owner_cache.set(username, owner)
+    return owner
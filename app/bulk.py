@@ -0,0 +1,87 @@
+import json
+
+from pydantic import ValidationError
+
+from . import crud
+from .config import BULK_CHUNK_SIZE
+from .db import run_db
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class BulkFormatError(Exception):
+    pass
+
+
+async def iter_items(request):
+    """Yield (index, item) from a JSON array body or, line by line, an NDJSON stream.
+
+    Lines that are not valid JSON are yielded as (index, BulkFormatError).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _parse_line(line)
+                    index += 1
+        if buffer.strip():
+            yield index, _parse_line(buffer)
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise BulkFormatError("Body is not valid JSON")
+    if not isinstance(items, list):
+        raise BulkFormatError("Body must be a JSON array")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return BulkFormatError("Line is not valid JSON")
+
+
+def validate_item(schema, item):
+    if isinstance(item, BulkFormatError):
+        return None, [str(item)]
+    try:
+        return schema.model_validate(item).model_dump(), None
+    except ValidationError as e:
+        return None, [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+                      for err in e.errors()]
+
+
+async def bulk_import(request, session, schema, model, entity, upsert_on=None):
+    """Validate each item with `schema` and write valid rows in chunks of BULK_CHUNK_SIZE."""
+    crud.check_upsert_key(model, upsert_on)
+    result = {"inserted": 0, "updated": 0, "errors": []}
+    chunk = []
+
+    async def flush():
+        inserted, updated, errors = await run_db(session, crud.bulk_save, model, entity, chunk,
+                                                 upsert_on)
+        result["inserted"] += inserted
+        result["updated"] += updated
+        result["errors"].extend(errors)
+        chunk.clear()
+
+    async for index, item in iter_items(request):
+        values, errors = validate_item(schema, item)
+        if errors:
+            result["errors"].append({"index": index, "errors": errors})
+            continue
+        chunk.append((index, values))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+    return result
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from .config import OWNER_CACHE_SIZE, OWNER_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_BYTES
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+# username -> {"id", "username", "email"}
+owner_cache = TTLCache(OWNER_CACHE_SIZE, OWNER_CACHE_TTL_SECONDS)
+
+
+class CachedResponse:
+    __slots__ = ("body", "headers", "etag", "entity", "item_id", "size", "variants")
+
+    def __init__(self, body, headers, entity, item_id):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.headers = headers + [(b"etag", self.etag.encode())]
+        self.entity = entity
+        self.item_id = item_id
+        self.size = len(body) + sum(len(k) + len(v) for k, v in self.headers)
+        # content-encoding -> (compressed body, etag), see app.compression
+        self.variants = {}
+
+
+class ResponseCache:
+    """LRU cache of encoded GET responses, bounded by total body size.
+
+    Entries belong to an entity ("projects", "blogs") and either one row id or
+    None for list/search responses, so a write only drops the pages that can
+    contain the changed row. Each entity also has a generation counter: a
+    response computed while a write happened is not stored.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.index = defaultdict(lambda: defaultdict(set))
+        self.generations = defaultdict(int)
+        self.size = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def generation(self, entity):
+        with self.lock:
+            return self.generations[entity]
+
+    def set(self, key, entry, generation):
+        if entry.size > self.max_entry_bytes:
+            return
+        with self.lock:
+            if self.generations[entry.entity] != generation:
+                return
+            self._remove(key)
+            self.entries[key] = entry
+            self.index[entry.entity][entry.item_id].add(key)
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def grow(self, key, entry, added):
+        """Account for `added` bytes stored on `entry`, e.g. a compressed variant."""
+        with self.lock:
+            entry.size += added
+            if self.entries.get(key) is not entry:
+                return
+            self.size += added
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, entity, item_id=None):
+        """Drop list pages of `entity` and the entries for `item_id`, or all of them if None."""
+        with self.lock:
+            self.generations[entity] += 1
+            by_id = self.index[entity]
+            if item_id is None:
+                keys = [key for keys in by_id.values() for key in keys]
+            else:
+                keys = list(by_id.get(None, ())) + list(by_id.get(item_id, ()))
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            for entity in list(self.index):
+                self.generations[entity] += 1
+            self.entries.clear()
+            self.index.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        keys = self.index[entry.entity][entry.item_id]
+        keys.discard(key)
+        if not keys:
+            del self.index[entry.entity][entry.item_id]
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,131 @@
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .cache import owner_cache, response_cache
+from .config import CACHE_COHERENCE, DB_URL
+from .db import IN_MEMORY
+from .portfolio import portfolio_snapshot
+
+logger = logging.getLogger(__name__)
+
+# The check runs before every request, so it waits only briefly for a lock;
+# when it gives up, this worker drops all its cached data instead.
+WATCHER_BUSY_TIMEOUT_MS = 100
+
+# cache entity -> table whose writes bump its version
+VERSIONED_TABLES = {"owners": "owners", "projects": "projects", "blogs": "blog_posts", "contacts": "contacts"}
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_invalidations():
+    """Collect invalidations made on this thread instead of applying them.
+
+    Used while writes sit in a transaction that has not committed yet: dropping
+    an entry then would let a concurrent reader cache the old rows again. The
+    caller applies the collected list once the commit has succeeded.
+    """
+    _deferred.pending = pending = []
+    try:
+        yield pending
+    finally:
+        _deferred.pending = None
+
+
+def invalidate_local(entity, row_id=None):
+    """Drop this process's cached data for `entity`, or just for `row_id` where caches allow it."""
+    pending = getattr(_deferred, "pending", None)
+    if pending is not None:
+        pending.append((entity, row_id))
+        return
+    if entity == "owners":
+        owner_cache.clear()
+        return
+    response_cache.invalidate(entity, row_id)
+    portfolio_snapshot.invalidate(entity)
+
+
+class VersionWatcher:
+    """Notice commits made by other connections and invalidate what they touched.
+
+    Triggers keep a row per entity in `cache_versions` with a counter and the
+    id of the last row written. `PRAGMA data_version` on a dedicated connection
+    changes only when another connection commits, so the common case is one
+    pragma per request and no table reads. When a version moved by exactly one
+    only that row is invalidated, otherwise the whole entity. sync() blocks on
+    SQLite, so callers on the event loop run it in the threadpool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.data_version = None
+        self.versions = {}
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={WATCHER_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def read_versions(self):
+        rows = self.conn.execute("SELECT entity, version, row_id FROM cache_versions")
+        return {entity: (version, row_id) for entity, version, row_id in rows}
+
+    def sync(self):
+        """Invalidate entries made stale by foreign commits. Returns [(entity, row_id or None)]."""
+        with self.lock:
+            changes = self.check()
+        for entity, row_id in changes:
+            invalidate_local(entity, row_id)
+        return changes
+
+    def check(self):
+        try:
+            if self.conn is None:
+                # (re)connecting records where this process starts from; after a
+                # failed check, anything cached may have gone stale meanwhile
+                self.conn = self.connect()
+                self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+                versions = self.read_versions()
+                changes = [(entity, None) for entity in self.versions]
+                self.versions = versions
+                return changes
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self.data_version:
+                return []
+            self.data_version = data_version
+            versions = self.read_versions()
+        except sqlite3.Error:
+            # e.g. migrations have not created cache_versions yet, or the
+            # database stayed locked; try again next time
+            logger.warning("cache coherence check failed", exc_info=True)
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            # what changed is unknown, so nothing cached can be trusted
+            return [(entity, None) for entity in VERSIONED_TABLES]
+        changes = []
+        for entity, (version, row_id) in versions.items():
+            seen = self.versions.get(entity, (0, None))[0]
+            if version != seen:
+                changes.append((entity, row_id if version == seen + 1 else None))
+        self.versions = versions
+        return changes
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# a single process owns an in-memory database, so there is nothing to watch
+version_watcher = None
+if CACHE_COHERENCE and not IN_MEMORY:
+    version_watcher = VersionWatcher(DB_URL.split("///", 1)[-1])
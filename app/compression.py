@@ -0,0 +1,78 @@
+import gzip
+
+from .config import COMPRESSION_ENABLED, COMPRESS_MIN_BYTES
+
+# brotli and zstandard are optional; without them only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every body is compressed once and then served from the cache many times, so
+# the levels favour size over speed.
+CODECS = {"gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+if brotli is not None:
+    CODECS["br"] = lambda body: brotli.compress(body, quality=9)
+if zstandard is not None:
+    CODECS["zstd"] = lambda body: zstandard.ZstdCompressor(level=12).compress(body)
+
+# used to break ties between encodings the client weights equally
+PREFERENCE = [name for name in ("zstd", "br", "gzip") if name in CODECS]
+
+
+def parse_accept_encoding(header):
+    """Return {coding: q} from an Accept-Encoding header value."""
+    weights = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def choose_encoding(accept_encoding, size):
+    """The encoding to send a `size` byte body in, or None to send it as is."""
+    if not COMPRESSION_ENABLED or not accept_encoding or size < COMPRESS_MIN_BYTES:
+        return None
+    weights = parse_accept_encoding(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    best = max(PREFERENCE, key=lambda name: (weights.get(name, wildcard), -PREFERENCE.index(name)))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+def variant(entry, encoding):
+    """Return ((body, etag), bytes added) for `entry` in `encoding`.
+
+    The body is compressed on first use and kept on the entry; the byte count
+    lets a size-bounded cache account for it.
+    """
+    cached = entry.variants.get(encoding)
+    if cached is not None:
+        return cached, 0
+    body = CODECS[encoding](entry.body)
+    # each representation needs its own strong ETag
+    cached = (body, entry.etag[:-1] + "-" + encoding + '"')
+    entry.variants[encoding] = cached
+    return cached, len(body)
+
+
+def response_headers(entry, encoding, etag):
+    headers = [(k, v) for k, v in entry.headers if k != b"etag"] + [(b"etag", etag.encode())]
+    if COMPRESSION_ENABLED:
+        headers.append((b"vary", b"Accept-Encoding"))
+    if encoding is not None:
+        headers.append((b"content-encoding", encoding.encode()))
+    return headers
@@ -0,0 +1,113 @@
+import os
+
+
+def env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Serve requests through an AsyncEngine (aiosqlite) instead of the threadpool
+ASYNC_DB = env_bool("PORTFOLIO_ASYNC_DB")
+
+DB_URL = os.getenv("PORTFOLIO_DB_URL", "sqlite:///./precioussteve.db")
+
+# SQLite connection profile, applied to every new connection
+DB_JOURNAL_MODE = os.getenv("PORTFOLIO_DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("PORTFOLIO_DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = env_int("PORTFOLIO_DB_BUSY_TIMEOUT_MS", 5000)
+# negative values are KiB, so -64000 is a ~64 MB page cache per connection
+DB_CACHE_SIZE = env_int("PORTFOLIO_DB_CACHE_SIZE", -64000)
+DB_MMAP_SIZE = env_int("PORTFOLIO_DB_MMAP_SIZE", 256 * 1024 * 1024)
+DB_TEMP_STORE = os.getenv("PORTFOLIO_DB_TEMP_STORE", "MEMORY")
+
+# readers share a pool; all writes go through a single connection
+DB_READ_POOL_SIZE = env_int("PORTFOLIO_DB_READ_POOL_SIZE", 8)
+DB_WRITE_POOL_TIMEOUT = env_int("PORTFOLIO_DB_WRITE_POOL_TIMEOUT", 30)
+
+BCRYPT_ROUNDS = env_int("PORTFOLIO_BCRYPT_ROUNDS", 12)
+# bcrypt runs in a process pool; requests beyond HASH_MAX_PENDING get a 503
+HASH_WORKERS = env_int("PORTFOLIO_HASH_WORKERS", os.cpu_count() or 1)
+HASH_MAX_PENDING = env_int("PORTFOLIO_HASH_MAX_PENDING", HASH_WORKERS * 4)
+
+# Access tokens are HMAC signed with this secret. Set it explicitly when running
+# more than one worker, otherwise each worker signs with its own random key.
+TOKEN_SECRET = os.getenv("PORTFOLIO_TOKEN_SECRET")
+TOKEN_TTL_SECONDS = env_int("PORTFOLIO_TOKEN_TTL_SECONDS", 3600)
+OWNER_CACHE_SIZE = env_int("PORTFOLIO_OWNER_CACHE_SIZE", 128)
+OWNER_CACHE_TTL_SECONDS = env_int("PORTFOLIO_OWNER_CACHE_TTL_SECONDS", 300)
+
+# GET responses for projects and blogs are cached in memory up to this many bytes
+RESPONSE_CACHE_MAX_BYTES = env_int("PORTFOLIO_RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+# rows per transaction for the bulk endpoints
+BULK_CHUNK_SIZE = env_int("PORTFOLIO_BULK_CHUNK_SIZE", 500)
+
+# rows fetched per round trip while streaming an export
+EXPORT_CHUNK_SIZE = env_int("PORTFOLIO_EXPORT_CHUNK_SIZE", 1000)
+
+EXCERPT_LENGTH = env_int("PORTFOLIO_EXCERPT_LENGTH", 200)
+READING_WORDS_PER_MINUTE = env_int("PORTFOLIO_READING_WORDS_PER_MINUTE", 200)
+
+# request/SQL metrics served at /metrics; statements slower than SLOW_QUERY_MS are logged
+METRICS_ENABLED = env_bool("PORTFOLIO_METRICS", True)
+SLOW_QUERY_MS = env_int("PORTFOLIO_SLOW_QUERY_MS", 100)
+
+# apply pending schema migrations in the app's lifespan hook; turn off to run
+# them only through `python -m app.migrations`
+MIGRATE_ON_STARTUP = env_bool("PORTFOLIO_MIGRATE_ON_STARTUP", True)
+
+# Token buckets on /login and /signup, keyed by client IP and by username. Each
+# bucket holds up to *_BURST attempts and refills at *_PER_MINUTE; attempts
+# over the limit get a 429 before any hashing or database work.
+THROTTLE_ENABLED = env_bool("PORTFOLIO_THROTTLE", True)
+LOGIN_IP_BURST = env_int("PORTFOLIO_LOGIN_IP_BURST", 20)
+LOGIN_IP_PER_MINUTE = env_int("PORTFOLIO_LOGIN_IP_PER_MINUTE", 10)
+SIGNUP_IP_BURST = env_int("PORTFOLIO_SIGNUP_IP_BURST", 5)
+SIGNUP_IP_PER_MINUTE = env_int("PORTFOLIO_SIGNUP_IP_PER_MINUTE", 2)
+THROTTLE_USER_BURST = env_int("PORTFOLIO_THROTTLE_USER_BURST", 5)
+THROTTLE_USER_PER_MINUTE = env_int("PORTFOLIO_THROTTLE_USER_PER_MINUTE", 2)
+THROTTLE_MAX_KEYS = env_int("PORTFOLIO_THROTTLE_MAX_KEYS", 100_000)
+# keep partly drained buckets in the database so limits survive a restart
+THROTTLE_PERSIST = env_bool("PORTFOLIO_THROTTLE_PERSIST", False)
+THROTTLE_FLUSH_SECONDS = env_int("PORTFOLIO_THROTTLE_FLUSH_SECONDS", 10)
+
+# GET /portfolio is served from a document materialized in memory and mirrored
+# to this file (empty to keep it in memory only); it lists the newest
+# SNAPSHOT_BLOG_LIMIT published blogs
+SNAPSHOT_PATH = os.getenv("PORTFOLIO_SNAPSHOT_PATH", "./portfolio_snapshot.json")
+SNAPSHOT_BLOG_LIMIT = env_int("PORTFOLIO_SNAPSHOT_BLOG_LIMIT", 50)
+
+# Cached GET responses are compressed with the best encoding the client accepts
+# (zstd, br or gzip) once, and the compressed body is cached with the response.
+# Bodies smaller than COMPRESS_MIN_BYTES are always sent as they are.
+COMPRESSION_ENABLED = env_bool("PORTFOLIO_COMPRESSION", True)
+COMPRESS_MIN_BYTES = env_int("PORTFOLIO_COMPRESS_MIN_BYTES", 1024)
+
+# Drop cache entries made stale by other workers writing to the same database.
+# Each request checks PRAGMA data_version, which only changes after a foreign
+# commit, and then reads the per-table versions kept by triggers.
+CACHE_COHERENCE = env_bool("PORTFOLIO_CACHE_COHERENCE", True)
+
+# Group commit: project, blog and contact writes are queued to one writer
+# thread, which runs up to WRITE_BATCH_MAX of them per transaction. It takes
+# whatever is queued when the previous commit finishes, and waits up to
+# WRITE_BATCH_DELAY_MS for more.
+WRITE_QUEUE = env_bool("PORTFOLIO_WRITE_QUEUE", False)
+WRITE_BATCH_MAX = env_int("PORTFOLIO_WRITE_BATCH_MAX", 64)
+WRITE_BATCH_DELAY_MS = env_int("PORTFOLIO_WRITE_BATCH_DELAY_MS", 0)
+
+# threads used to re-render stored blog HTML after the renderer changes
+RENDER_WORKERS = env_int("PORTFOLIO_RENDER_WORKERS", 4)
+
+# Idempotency-Key on POST /projects/, /blogs/ and /contacts/: the first
+# successful response is stored this long and replayed to retries
+IDEMPOTENCY_TTL_SECONDS = env_int("PORTFOLIO_IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+# recent keys kept in memory so a replay does not query the database
+IDEMPOTENCY_CACHE_SIZE = env_int("PORTFOLIO_IDEMPOTENCY_CACHE_SIZE", 10_000)
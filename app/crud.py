@@ -1,23 +1,25 @@
-from . import models
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from datetime import datetime, timezone
 
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+from . import models
+from .cache import owner_cache
+from .coherence import invalidate_local
+from .pagination import paginate, DEFAULT_LIMIT
+from .render import is_current, rendered, with_html
+from .search import SEARCH_SQL, build_match_query, mark_matches
+from .summary import summarize, with_summary
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
-def create_owner(session, owner):
-    hashed_password = get_password_hash(owner.password)
+def create_owner(session, owner, hashed_password):
     new_owner = models.Owner(username=owner.username,
                              email=owner.email,
                              hashed_password = hashed_password)
     session.add(new_owner)
     session.commit()
     session.refresh(new_owner)
+    owner_cache.delete(new_owner.username)
     
     return new_owner
 
@@ -27,97 +29,206 @@ def check_email(session, email):
     return owner
 
 
-def authenticate_owner(session, username, password):
-    owner = session.query(models.Owner).filter(models.Owner.username == username).first()
-    if owner and verify_password(password, owner.hashed_password):
-        return owner
-   
-
 def get_owner_by_username(session, username):
     return session.query(models.Owner).filter(models.Owner.username == username).first()
 
+
+def update_owner_password(session, owner, hashed_password):
+    # `owner` was loaded by another (read) session
+    session.execute(update(models.Owner).where(models.Owner.id == owner.id)
+                    .values(hashed_password=hashed_password))
+    session.commit()
+    owner_cache.delete(owner.username)
+
+def _changed(entity, row_id=None):
+    # every write to projects, blogs or contacts ends here; other workers
+    # learn about it through the cache_versions triggers (see app.coherence)
+    invalidate_local(entity, row_id)
+
+
+# Single-statement writes: UPDATE/DELETE ... RETURNING hands back the row in
+# the same round trip, so there is no SELECT before or refresh after.
+def _update_returning(session, model, row_id, values):
+    if not values:
+        return get_row(session, model, row_id)
+    columns = model.__table__.columns
+    row = session.execute(update(model).where(model.id == row_id).values(**values)
+                          .returning(*columns)).mappings().first()
+    session.commit()
+    return dict(row) if row else None
+
+
+def _delete_returning(session, model, row_id):
+    row = session.execute(delete(model).where(model.id == row_id)
+                          .returning(*model.__table__.columns)).mappings().first()
+    session.commit()
+    return dict(row) if row else None
+
+
+def get_row(session, model, row_id):
+    row = session.execute(select(*model.__table__.columns).where(model.id == row_id)).mappings().first()
+    return dict(row) if row else None
+
+
 # for project
 def create_project(session, project):
     new_project = models.Project(title=project.title, description=project.description, project_link=project.project_link)
     session.add(new_project)
     session.commit()
     session.refresh(new_project)
+    _changed("projects", new_project.id)
     return new_project
 
 
-def get_all_projects(session):
-    return session.query(models.Project).all()
+PROJECT_SORT_FIELDS = ("id", "title")
+# the columns of schemas.ProjectOut, returned when no projection is asked for
+PROJECT_LIST_FIELDS = ("id", "title", "description", "project_link", "created_at", "updated_at")
+
+
+def get_all_projects(session, limit=DEFAULT_LIMIT, cursor=None, sort="id", fields=None):
+    return paginate(session, models.Project, PROJECT_SORT_FIELDS, PROJECT_LIST_FIELDS,
+                    limit=limit, cursor=cursor, sort=sort, fields=fields)
 
 
 def get_single_project(session, project_id):
     return session.query(models.Project).filter(models.Project.id == project_id).first()
 
 
+def update_project(session, project_id, values):
+    project = _update_returning(session, models.Project, project_id, values)
+    if project is not None:
+        _changed("projects", project_id)
+    return project
+
+
 def edit_project(session, project_id, project):
-    add_project = session.query(models.Project).filter(models.Project.id == project_id).first()
-    if not add_project:
-        return None
-    for key, value in project.dict().items():
-        setattr(add_project, key, value)
-    session.commit()
-    session.refresh(add_project)
-    return add_project
+    return update_project(session, project_id, project.dict())
 
 
 def delete_project(session, project_id):
-    project = session.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
-        return None
-    session.delete(project)
-    session.commit()
+    project = _delete_returning(session, models.Project, project_id)
+    if project is not None:
+        _changed("projects", project_id)
     return project
 
 
 def delete_all_projects(session):
     session.query(models.Project).delete()
     session.commit()
+    _changed("projects")
     
     
 # for blog
+def utc_naive(moment):
+    """DateTime columns hold naive UTC; convert aware datetimes before comparing or storing."""
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def with_published_at(values, stamp=None):
+    """Stamp published_at when `values` publish a post and clear it when they unpublish it.
+
+    An explicit published_at is kept. `stamp` replaces the current time for
+    published posts; updates pass coalesce(published_at, now) so re-saving a
+    post keeps its original publication date.
+    """
+    if values.get("published_at") is not None:
+        return dict(values, published_at=utc_naive(values["published_at"]))
+    if "published" not in values:
+        return values
+    if not values["published"]:
+        return dict(values, published_at=None)
+    if stamp is None:
+        stamp = utc_naive(datetime.now(timezone.utc))
+    return dict(values, published_at=stamp)
+
+
 def create_blog(session, blog):
-    new_blog = models.Blog(title=blog.title, content=blog.content, author=blog.author, published=blog.published)
+    publication = with_published_at({"published": blog.published, "published_at": blog.published_at})
+    new_blog = models.Blog(title=blog.title, content=blog.content, author=blog.author, **publication,
+                           **summarize(blog.content), **rendered(blog.content))
     session.add(new_blog)
     session.commit()
     session.refresh(new_blog)
+    _changed("blogs", new_blog.id)
     
     return new_blog
 
 
-def get_all_blogs(session):
-    return session.query(models.Blog).all()
+BLOG_SORT_FIELDS = ("id", "title", "author", "published")
+# the columns of schemas.BlogOut; the rendered HTML is only served by get_blog_html
+BLOG_LIST_FIELDS = ("id", "title", "content", "author", "published", "published_at", "excerpt", "word_count",
+                    "reading_time", "created_at", "updated_at")
+
+
+def get_all_blogs(session, limit=DEFAULT_LIMIT, cursor=None, sort="id", fields=None, published=None,
+                  author=None, published_after=None, published_before=None):
+    # every filter is served by one of the indexes declared on models.Blog
+    where = []
+    if published is not None:
+        where.append(models.Blog.published == published)
+    if author is not None:
+        where.append(models.Blog.author == author)
+    if published_after is not None:
+        where.append(models.Blog.published_at >= utc_naive(published_after))
+    if published_before is not None:
+        where.append(models.Blog.published_at < utc_naive(published_before))
+    return paginate(session, models.Blog, BLOG_SORT_FIELDS, BLOG_LIST_FIELDS, where,
+                    limit=limit, cursor=cursor, sort=sort, fields=fields)
+
+def search_blogs(session, q, limit=20):
+    query = build_match_query(q)
+    if query is None:
+        return []
+    rows = [dict(row._mapping) for row in session.execute(SEARCH_SQL, {"query": query, "limit": limit})]
+    for row in rows:
+        # the post text is untrusted; only the <mark> tags are markup
+        row["title_highlight"] = mark_matches(row["title_highlight"])
+        row["snippet"] = mark_matches(row["snippet"])
+    return rows
+
 
 def get_single_blog(session, blog_id):
     return session.query(models.Blog).filter(models.Blog.id == blog_id).first()
 
 
+def get_blog_html(session, blog_id):
+    blog = get_row(session, models.Blog, blog_id)
+    if blog is not None and not is_current(blog):
+        # not re-rendered yet after an upgrade or a direct write; rerender_stale() will store it
+        blog.update(rendered(blog["content"]))
+    return blog
+
+
+def update_blog(session, blog_id, values):
+    values = with_published_at(with_summary(values),
+                               stamp=func.coalesce(models.Blog.published_at, utc_naive(datetime.now(timezone.utc))))
+    if "content" in values:
+        stored = session.execute(select(models.Blog.content_hash, models.Blog.html_renderer)
+                                 .where(models.Blog.id == blog_id)).first()
+        values = with_html(values, stored)
+    blog = _update_returning(session, models.Blog, blog_id, values)
+    if blog is not None:
+        _changed("blogs", blog_id)
+    return blog
+
+
 def edit_blog(session, blog_id, blog):
-    edit_blog = session.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    if not edit_blog:
-        return None
-    for key, value in blog.dict().items():
-        setattr(edit_blog, key, value)
-    session.commit()
-    session.refresh(edit_blog)
-    return edit_blog
+    return update_blog(session, blog_id, blog.dict())
 
 
 def delete_blog(session, blog_id):
-    blog = session.query(models.Blog).filter(models.Blog.id == blog_id).first()
-    if not blog:
-        return None
-    session.delete(blog)
-    session.commit()
+    blog = _delete_returning(session, models.Blog, blog_id)
+    if blog is not None:
+        _changed("blogs", blog_id)
     return blog
 
 
 def delete_all_blogs(session):
     session.query(models.Blog).delete()
     session.commit()
+    _changed("blogs")
     
     
 #contact
@@ -126,24 +237,137 @@ def create_contact(session, contact):
     session.add(new_contact)
     session.commit()
     session.refresh(new_contact)
+    _changed("contacts", new_contact.id)
     
     return new_contact
 
 
+def update_contact(session, contact_id: int, values):
+    contact = _update_returning(session, models.Contact_Info, contact_id, values)
+    if contact is not None:
+        _changed("contacts", contact_id)
+    return contact
+
+
 def edit_contact(session, contact_id: int, contact):
-    edited_contact = session.query(models.Contact_Info).filter(models.Contact_Info.id == contact_id).first()
-    if not edited_contact:
-        return None
-    for key, value in contact.dict().items():
-        setattr(edited_contact, key, value)
-    session.commit()
-    session.refresh(edited_contact)
-    return edited_contact
+    return update_contact(session, contact_id, contact.dict())
+
 
 def delete_contact(session, contact_id: int):
-    contact = session.query(models.Contact_Info).filter(models.Contact_Info.id == contact_id).first()
-    if not contact:
-        return None
-    session.delete(contact)
-    session.commit()
+    contact = _delete_returning(session, models.Contact_Info, contact_id)
+    if contact is not None:
+        _changed("contacts", contact_id)
     return contact
+
+
+# export
+def iter_table_rows(session, model, chunk_size):
+    """Yield lists of up to `chunk_size` plain rows, reading the table incrementally."""
+    columns = list(model.__table__.columns)
+    result = session.execute(select(*columns).order_by(model.id).execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield partition
+
+
+# change feed
+CHANGE_MODELS = {"projects": models.Project, "blogs": models.Blog, "contacts": models.Contact_Info}
+
+
+def get_changes(session, since=0, limit=DEFAULT_LIMIT):
+    """Return up to `limit` changes after seq `since`, oldest first, and whether more follow.
+
+    The changes table is filled by triggers (see migrations.change_log), holds
+    an upsert for every row that predates it (change_log_seed) and keeps only
+    the latest entry per row. Upserts carry the row as it is now,
+    read in the same transaction as the log, so a consumer that applies them
+    in order and resumes from the last seq ends up with the current tables.
+    """
+    changes = [dict(row) for row in session.execute(text(
+        "SELECT seq, entity, row_id AS id, op, changed_at FROM changes WHERE seq > :since "
+        "ORDER BY seq LIMIT :limit"), {"since": since, "limit": limit + 1}).mappings()]
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    for entity, model in CHANGE_MODELS.items():
+        ids = [change["id"] for change in changes if change["entity"] == entity and change["op"] == "upsert"]
+        if not ids:
+            continue
+        rows = {row.id: row for row in session.scalars(select(model).where(model.id.in_(ids)))}
+        for change in changes:
+            if change["entity"] == entity:
+                change["data"] = rows.get(change["id"])
+    return changes, has_more
+
+
+# bulk
+BULK_UPSERT_KEYS = {
+    models.Project: ("title", "project_link"),
+    models.Blog: ("title",),
+    models.Contact_Info: ("email",),
+}
+
+
+def check_upsert_key(model, upsert_on):
+    if upsert_on and upsert_on not in BULK_UPSERT_KEYS[model]:
+        raise ValueError(f"Cannot upsert on {upsert_on}")
+
+
+def _write_bulk_chunk(session, model, rows, upsert_on):
+    inserts = {}
+    updates = {}
+    blogs = model is models.Blog
+    if blogs:
+        rows = [(i, with_html(with_summary(row))) for i, row in rows]
+    if upsert_on:
+        column = getattr(model, upsert_on)
+        keys = {row[upsert_on] for _, row in rows}
+        # for blogs also the current published_at: as in update_blog, an
+        # updated post that was already published keeps its original date
+        published_at = [model.published_at] if blogs else []
+        existing = {key: rest for key, *rest in session.execute(
+            select(column, model.id, *published_at).where(column.in_(keys)))}
+        # later rows with the same key win
+        for _, row in rows:
+            key = row[upsert_on]
+            if key in existing:
+                row_id, *current = existing[key]
+                if blogs:
+                    row = with_published_at(row, stamp=current[0])
+                updates[key] = dict(row, id=row_id)
+            else:
+                inserts[key] = with_published_at(row) if blogs else row
+    else:
+        inserts = {i: with_published_at(row) if blogs else row for i, row in rows}
+    if inserts:
+        session.execute(insert(model), list(inserts.values()))
+    if updates:
+        session.execute(update(model), list(updates.values()))
+    session.commit()
+    return len(inserts), len(updates)
+
+
+def bulk_save(session, model, entity, rows, upsert_on=None):
+    """Insert (or upsert by `upsert_on`) validated rows in one transaction.
+
+    `rows` is a list of (index, values) pairs. If the batch fails as a whole it
+    is retried row by row so one bad row only fails itself. Returns
+    (inserted, updated, errors).
+    """
+    check_upsert_key(model, upsert_on)
+    errors = []
+    try:
+        inserted, updated = _write_bulk_chunk(session, model, rows, upsert_on)
+    except SQLAlchemyError:
+        session.rollback()
+        inserted = updated = 0
+        for row in rows:
+            try:
+                row_inserted, row_updated = _write_bulk_chunk(session, model, [row], upsert_on)
+            except SQLAlchemyError as e:
+                session.rollback()
+                errors.append({"index": row[0], "errors": [str(e)]})
+            else:
+                inserted += row_inserted
+                updated += row_updated
+    if inserted or updated:
+        _changed(entity)
+    return inserted, updated, errors
@@ -1,11 +1,175 @@
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .config import (ASYNC_DB, DB_URL, DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT_MS,
+                     DB_CACHE_SIZE, DB_MMAP_SIZE, DB_TEMP_STORE, DB_READ_POOL_SIZE,
+                     DB_WRITE_POOL_TIMEOUT)
+
+# an in-memory database only exists on its own connection, so it cannot be split
+IN_MEMORY = DB_URL in ("sqlite://", "sqlite:///:memory:")
+ASYNC_DB_URL = DB_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+Base = declarative_base()
+
+# Engines are created on first use rather than at import, so importing the app
+# (tests, CLI commands, worker boot) never touches the database file.
+_engines = {}
+_engines_lock = threading.Lock()
+_engine_listeners = []
+
+
+def on_engine_created(listener):
+    """Call `listener(sync_engine)` for every engine, including ones created later."""
+    _engine_listeners.append(listener)
+    with _engines_lock:
+        for created in _engines.values():
+            listener(getattr(created, "sync_engine", created))
+
+
+def set_sqlite_pragmas(dbapi_connection, read_only):
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # journal_mode is persistent in the file, so only the writer sets it
+        cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size={int(DB_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA temp_store={DB_TEMP_STORE}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def build_engine(create, url, read_only, poolclass=QueuePool):
+    if IN_MEMORY:
+        kwargs = {}
+    elif read_only:
+        kwargs = {"poolclass": poolclass, "pool_size": DB_READ_POOL_SIZE, "max_overflow": 0}
+    else:
+        kwargs = {"poolclass": poolclass, "pool_size": 1, "max_overflow": 0,
+                  "pool_timeout": DB_WRITE_POOL_TIMEOUT}
+    new_engine = create(url, connect_args={"check_same_thread":False}, **kwargs)
+    sync_engine = getattr(new_engine, "sync_engine", new_engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        set_sqlite_pragmas(dbapi_connection, read_only)
+
+    for listener in _engine_listeners:
+        listener(sync_engine)
+    return new_engine
+
+
+def _get(name, build):
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = build()
+        return _engines[name]
+
+
+def get_engine():
+    return _get("writer", lambda: build_engine(create_engine, DB_URL, read_only=False))
+
+
+def get_read_engine():
+    if IN_MEMORY:
+        return get_engine()
+    return _get("reader", lambda: build_engine(create_engine, DB_URL, read_only=True))
+
+
+def get_async_engine():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    return _get("async_writer", lambda: build_engine(create_async_engine, ASYNC_DB_URL, read_only=False,
+                                                     poolclass=AsyncAdaptedQueuePool))
+
+
+def get_async_read_engine():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if IN_MEMORY:
+        return get_async_engine()
+    return _get("async_reader", lambda: build_engine(create_async_engine, ASYNC_DB_URL, read_only=True,
+                                                     poolclass=AsyncAdaptedQueuePool))
+
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+
+def db_session():
+    """A session on the single writer connection."""
+    return _session_factory(bind=get_engine())
+
+
+def read_db_session():
+    """A session on the read-only connection pool."""
+    return _session_factory(bind=get_read_engine())
+
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    # objects returned by crud are serialized after the commit, so keep them loaded
+    _async_session_factory = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+    def async_db_session():
+        return _async_session_factory(bind=get_async_engine())
+
+    def async_read_db_session():
+        return _async_session_factory(bind=get_async_read_engine())
+
+
+async def dispose_engines():
+    # pooled aiosqlite connections each own a worker thread that keeps the
+    # process alive until the connection is closed
+    with _engines_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for created in engines:
+        result = created.dispose()
+        if result is not None:
+            await result
+
+
+async def run_db(session, fn, *args, **kwargs):
+    """Run a sync crud function against either kind of session.
+
+    With an AsyncSession the function runs on the event loop via `run_sync`,
+    so the request never takes a threadpool slot. A plain Session keeps the
+    previous behaviour of running the blocking call in the threadpool.
+    """
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, session, *args, **kwargs)
+
+
+async def _run_in_own_session(writer, fn, args, kwargs):
+    if ASYNC_DB:
+        async with (async_db_session() if writer else async_read_db_session()) as session:
+            return await session.run_sync(fn, *args, **kwargs)
+
+    def call():
+        with (db_session() if writer else read_db_session()) as session:
+            return fn(session, *args, **kwargs)
+    return await run_in_threadpool(call)
+
 
-DB_URL = "sqlite:///./precioussteve.db"
+async def run_db_read(fn, *args, **kwargs):
+    """Run a sync crud function in a read session held only for that call.
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread":False})
+    For endpoints that await slow work, such as password hashing, after
+    their reads: no pooled connection stays checked out while they wait.
+    """
+    return await _run_in_own_session(False, fn, args, kwargs)
 
-db_session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
-Base = declarative_base()
\ No newline at end of file
+async def run_db_write(fn, *args, **kwargs):
+    """Like run_db_read, on the single writer connection."""
+    return await _run_in_own_session(True, fn, args, kwargs)
@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import zlib
+
+from fastapi.responses import StreamingResponse
+
+from . import crud
+from .config import EXPORT_CHUNK_SIZE
+from .db import read_db_session
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_ndjson(columns, rows):
+    return "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def encode_csv(columns, rows):
+    out = io.StringIO()
+    csv.writer(out).writerows(rows)
+    return out.getvalue()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+def iter_export(model, format, compress):
+    # The request's session is closed before a streaming body is sent, so the
+    # generator owns its own read-only session for as long as the stream runs.
+    encode = ENCODERS[format]
+    columns = [column.name for column in model.__table__.columns]
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(text):
+        chunk = text.encode()
+        return compressor.compress(chunk) if compressor else chunk
+
+    session = read_db_session()
+    try:
+        if format == "csv":
+            yield emit(encode_csv(columns, [columns]))
+        for rows in crud.iter_table_rows(session, model, EXPORT_CHUNK_SIZE):
+            chunk = emit(encode(columns, rows))
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        session.close()
+
+
+def export_response(model, name, format, compress=False):
+    filename = f"{name}.{format}" + (".gz" if compress else "")
+    media_type = "application/gzip" if compress else MEDIA_TYPES[format]
+    return StreamingResponse(iter_export(model, format, compress), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
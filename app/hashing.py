@@ -0,0 +1,122 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import BCRYPT_ROUNDS, HASH_WORKERS, HASH_MAX_PENDING
+
+
+@functools.lru_cache(maxsize=None)
+def get_pwd_context():
+    # built on first use: only the hashing worker processes ever need it
+    from passlib.context import CryptContext
+
+    # min_rounds makes needs_update() flag hashes made with fewer rounds, so they
+    # are upgraded the next time their owner logs in.
+    return CryptContext(schemes=["bcrypt"], deprecated="auto",
+                        bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS)
+
+
+class HashQueueFull(Exception):
+    """Raised when too many hashes are already waiting for a worker."""
+
+
+class QueueWaitMetrics:
+    """Time between submitting a hash and a worker starting on it."""
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rejected = 0
+        self.bucket_counts = [0] * len(self.buckets)
+
+    def observe(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "rejected": self.rejected,
+                "pending": _pending,
+                "avg_wait_seconds": self.total / self.count if self.count else 0.0,
+                "max_wait_seconds": self.max,
+                "buckets": dict(zip(self.buckets, self.bucket_counts)),
+            }
+
+
+queue_wait = QueueWaitMetrics()
+
+_pending = 0
+_pending_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the server process already runs threads
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+# these run inside the worker processes
+def _hash(password):
+    return time.time(), get_pwd_context().hash(password)
+
+
+def _verify_and_update(password, hashed_password):
+    return time.time(), get_pwd_context().verify_and_update(password, hashed_password)
+
+
+async def _submit(fn, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= HASH_MAX_PENDING:
+            queue_wait.reject()
+            raise HashQueueFull()
+        _pending += 1
+    submitted = time.time()
+    try:
+        started, result = await asyncio.wrap_future(_get_executor().submit(fn, *args))
+    finally:
+        with _pending_lock:
+            _pending -= 1
+    queue_wait.observe(max(started - submitted, 0.0))
+    return result
+
+
+async def hash_password(password):
+    return await _submit(_hash, password)
+
+
+async def verify_password(password, hashed_password):
+    """Return (valid, new_hash); new_hash is set when the stored hash is outdated."""
+    return await _submit(_verify_and_update, password, hashed_password)
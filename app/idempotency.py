@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+
+from sqlalchemy import text
+
+from .cache import TTLCache
+from .config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS
+from .db import db_session
+
+# POST routes that insert a row; a retry carrying the same Idempotency-Key
+# gets the first response back instead of creating a duplicate
+IDEMPOTENT_ROUTES = {"/projects/", "/blogs/", "/contacts/"}
+MAX_KEY_LENGTH = 255
+# a reservation whose request never finished (the worker died) is taken over after this
+PENDING_TIMEOUT_SECONDS = 60
+# expired keys are deleted after every this many stored responses
+PURGE_EVERY = 500
+
+
+class KeyInUse(Exception):
+    """Another request with the same key has not finished yet."""
+
+
+class KeyMismatch(Exception):
+    """The key was first used for a different request."""
+
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status", "content_type", "body", "created")
+
+    def __init__(self, fingerprint, status, content_type, body, created):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.created = created
+
+
+def fingerprint(path, authorization, body):
+    """Hash what makes two requests the same: the route, the caller and the body."""
+    digest = hashlib.sha256()
+    for part in (path.encode(), authorization or b"", body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Responses to idempotent creates, in `idempotency_keys` and an in-memory LRU.
+
+    A first request reserves its key with a row that has no status yet, so a
+    concurrent retry on any worker sees the key in use instead of inserting
+    again. A 2xx response is stored on the row; any other outcome releases the
+    key so the client can fix the request and retry. Stored responses never
+    change, so each worker's LRU can serve them without checking the database.
+    """
+
+    def __init__(self, ttl, cache_size):
+        self.ttl = ttl
+        self.recent = TTLCache(cache_size, ttl)
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    def begin(self, key, digest):
+        """Return the stored response for `key`, or None once `key` is reserved for this request.
+
+        Raises KeyMismatch or KeyInUse.
+        """
+        stored = self.recent.get(key)
+        if stored is None or stored.created + self.ttl < time.time():
+            stored = self._reserve(key, digest)
+            if stored is None:
+                return None
+        if stored.fingerprint != digest:
+            self._count("conflicts")
+            raise KeyMismatch()
+        self._count("replayed")
+        return stored
+
+    def _reserve(self, key, digest):
+        now = time.time()
+        with db_session() as session:
+            # writing first takes the write lock up front, so the check below
+            # cannot race another worker's reservation
+            inserted = session.execute(text(
+                "INSERT INTO idempotency_keys (key, fingerprint, created) VALUES (:key, :fingerprint, :now) "
+                "ON CONFLICT (key) DO NOTHING"), {"key": key, "fingerprint": digest, "now": now}).rowcount
+            if inserted:
+                session.commit()
+                return None
+            row = session.execute(text(
+                "SELECT fingerprint, status, content_type, body, created FROM idempotency_keys WHERE key = :key"),
+                {"key": key}).one()
+            expired = row.created + self.ttl < now
+            abandoned = row.status is None and row.created + PENDING_TIMEOUT_SECONDS < now
+            if expired or abandoned:
+                session.execute(text(
+                    "UPDATE idempotency_keys SET fingerprint = :fingerprint, status = NULL, content_type = NULL, "
+                    "body = NULL, created = :now WHERE key = :key"), {"key": key, "fingerprint": digest, "now": now})
+                session.commit()
+                return None
+            session.rollback()
+        if row.status is None:
+            self._count("conflicts")
+            raise KeyMismatch() if row.fingerprint != digest else KeyInUse()
+        stored = StoredResponse(row.fingerprint, row.status, row.content_type, row.body, row.created)
+        self.recent.set(key, stored)
+        return stored
+
+    def finish(self, key, digest, status, content_type, body):
+        """Store a 2xx response for `key`, or release the reservation for anything else."""
+        with db_session() as session:
+            if 200 <= status < 300:
+                now = time.time()
+                session.execute(text(
+                    "UPDATE idempotency_keys SET status = :status, content_type = :content_type, body = :body, "
+                    "created = :now WHERE key = :key AND fingerprint = :fingerprint"),
+                    {"key": key, "fingerprint": digest, "status": status, "content_type": content_type,
+                     "body": body, "now": now})
+                self.recent.set(key, StoredResponse(digest, status, content_type, body, now))
+                if self._count("stored") % PURGE_EVERY == 0:
+                    session.execute(text("DELETE FROM idempotency_keys WHERE created < :cutoff"),
+                                    {"cutoff": now - self.ttl})
+            else:
+                session.execute(text(
+                    "DELETE FROM idempotency_keys WHERE key = :key AND fingerprint = :fingerprint "
+                    "AND status IS NULL"), {"key": key, "fingerprint": digest})
+            session.commit()
+
+    def _count(self, name):
+        with self.lock:
+            value = getattr(self, name) + 1
+            setattr(self, name, value)
+            return value
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_CACHE_SIZE)
+
+
+def metrics_lines():
+    lines = []
+    for name, value, help_text in (
+        ("idempotent_replays_total", idempotency_store.replayed,
+         "Retried creates answered with the stored response."),
+        ("idempotent_conflicts_total", idempotency_store.conflicts,
+         "Idempotency keys rejected as in use or reused for a different request."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    return lines
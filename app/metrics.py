@@ -0,0 +1,178 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from .config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# stats of the request being handled; copied into threadpool workers with the context
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.db_time = defaultdict(float)
+        self.responses = defaultdict(int)
+        self.slow_queries = 0
+
+    def record(self, method, route, status, seconds, stats):
+        with self.lock:
+            self.latency[(method, route)].observe(seconds)
+            self.queries[(method, route)].observe(stats.queries)
+            self.db_time[(method, route)] += stats.db_time
+            self.responses[(method, route, status)] += 1
+
+    def render(self, extra=()):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines += ["# HELP http_requests_total Responses sent, by route and status.",
+                      "# TYPE http_requests_total counter"]
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            render_histograms(lines, "http_request_duration_seconds",
+                              "Time to handle a request, including sending the body.",
+                              self.latency)
+            render_histograms(lines, "db_queries_per_request", "SQL statements executed per request.",
+                              self.queries)
+            lines += ["# HELP db_time_seconds_total Time spent executing SQL, by route.",
+                      "# TYPE db_time_seconds_total counter"]
+            for (method, route), seconds in sorted(self.db_time.items()):
+                lines.append(f'db_time_seconds_total{{method="{method}",route="{route}"}} {seconds:.6f}')
+            lines += ["# HELP db_slow_queries_total Statements slower than the slow query threshold.",
+                      "# TYPE db_slow_queries_total counter", f"db_slow_queries_total {self.slow_queries}"]
+        lines += extra
+        return "\n".join(lines) + "\n"
+
+
+def render_histograms(lines, name, help_text, histograms):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = f'method="{method}",route="{route}"'
+        # observe() counts a value in every bucket it fits, so counts are already cumulative
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+registry = Registry()
+
+
+def hash_queue_lines(queue_wait):
+    snapshot = queue_wait.snapshot()
+    name = "password_hash_queue_wait_seconds"
+    lines = [f"# HELP {name} Time password hashes wait for a worker process.", f"# TYPE {name} histogram"]
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+    lines += [f'{name}_bucket{{le="+Inf"}} {snapshot["count"]}',
+              f'{name}_sum {snapshot["avg_wait_seconds"] * snapshot["count"]:.6f}',
+              f'{name}_count {snapshot["count"]}',
+              "# HELP password_hash_rejected_total Hashes refused because the queue was full.",
+              "# TYPE password_hash_rejected_total counter",
+              f'password_hash_rejected_total {snapshot["rejected"]}']
+    return lines
+
+
+def instrument_engine(engine):
+    """Count statements and DB time for the current request, and log slow statements."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            with registry.lock:
+                registry.slow_queries += 1
+            logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split()))
+
+
+def route_template(app, scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # responses served before routing (e.g. from the response cache)
+    for candidate in app.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Time each request, attach a Server-Timing header and record it in `registry`."""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                timing = (f'app;dur={elapsed:.2f}, db;dur={stats.db_time * 1000:.2f};'
+                          f'desc="{stats.queries} queries"')
+                message = dict(message, headers=list(message.get("headers", [])) +
+                               [(b"server-timing", timing.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - start
+            registry.record(scope["method"], route_template(self.router, scope), status,
+                            elapsed, stats)
@@ -0,0 +1,222 @@
+import re
+
+import orjson
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import CachedResponse, response_cache
+from .coherence import version_watcher
+from .compression import choose_encoding, response_headers, variant
+from .idempotency import (IDEMPOTENT_ROUTES, MAX_KEY_LENGTH, KeyInUse, KeyMismatch, fingerprint,
+                          idempotency_store)
+
+# path -> (entity, row id or None for list/search pages)
+CACHEABLE_ROUTES = [
+    (re.compile(r"^/(projects|blogs)/$"), None),
+    (re.compile(r"^/(blogs)/search$"), None),
+    (re.compile(r"^/(projects|blogs)/(\d+)$"), 2),
+]
+
+
+def match_cacheable(path):
+    for pattern, id_group in CACHEABLE_ROUTES:
+        match = pattern.match(path)
+        if match:
+            return match.group(1), int(match.group(id_group)) if id_group else None
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == b"*":
+        return True
+    return etag.encode() in [tag.strip() for tag in if_none_match.split(b",")]
+
+
+async def encode_entry(entry, accept_encoding):
+    """Return (encoding, body, etag, bytes added to the entry) for the client's Accept-Encoding."""
+    encoding = choose_encoding(accept_encoding, len(entry.body))
+    if encoding is None:
+        return None, entry.body, entry.etag, 0
+    cached = entry.variants.get(encoding)
+    added = 0
+    if cached is None:
+        # compressing a large body takes milliseconds; keep it off the event loop
+        cached, added = await run_in_threadpool(variant, entry, encoding)
+    body, etag = cached
+    return encoding, body, etag, added
+
+
+class ResponseCacheMiddleware:
+    """Serve repeated GETs from `response_cache`, with ETag / If-None-Match support.
+
+    Only successful responses are stored. crud invalidates entries when it
+    writes the entity they were built from. Compressed variants are built on
+    first request for each encoding and stored on the entry, so they are
+    dropped together with it.
+    """
+
+    def __init__(self, app, cache=response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        route = match_cacheable(scope["path"])
+        if route is None:
+            return await self.app(scope, receive, send)
+
+        entity, item_id = route
+        key = (scope["path"], scope["query_string"])
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match")
+        accept_encoding = headers.get(b"accept-encoding", b"").decode("latin-1")
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return await self.send_entry(key, entry, if_none_match, accept_encoding, send)
+
+        generation = self.cache.generation(entity)
+        start = None
+        chunks = []
+
+        async def buffer_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] != 200:
+                    await send(message)
+                return
+            if start["status"] != 200:
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                headers = [(k, v) for k, v in start["headers"] if k != b"content-length"]
+                new_entry = CachedResponse(b"".join(chunks), headers, entity, item_id)
+                self.cache.set(key, new_entry, generation)
+                await self.send_entry(key, new_entry, if_none_match, accept_encoding, send)
+
+        await self.app(scope, receive, buffer_send)
+
+    async def send_entry(self, key, entry, if_none_match, accept_encoding, send):
+        encoding, body, etag, added = await encode_entry(entry, accept_encoding)
+        if added:
+            self.cache.grow(key, entry, added)
+        await send_encoded(entry, encoding, body, etag, if_none_match, send)
+
+
+async def send_encoded(entry, encoding, body, etag, if_none_match, send):
+    if etag_matches(if_none_match, etag):
+        headers = [(b"etag", etag.encode())]
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    headers = response_headers(entry, encoding, etag) + [(b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class CoherenceMiddleware:
+    """Before each request, drop cache entries that other workers' writes made stale."""
+
+    def __init__(self, app, watcher=version_watcher):
+        self.app = app
+        self.watcher = watcher
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.watcher is not None:
+            # sqlite calls; keep them off the event loop
+            await run_in_threadpool(self.watcher.sync)
+        await self.app(scope, receive, send)
+
+
+async def send_error(send, status, detail, headers=()):
+    body = orjson.dumps({"detail": detail})
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Answer a retried create that carries a known Idempotency-Key with the first response.
+
+    Runs before routing, so a replay reads neither the entity tables nor the
+    body's schema: only the stored response is sent, marked with an
+    `Idempotent-Replayed` header.
+    """
+
+    def __init__(self, app, store=idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await send_error(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+        key = key.decode("latin-1")
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        digest = fingerprint(scope["path"], headers.get(b"authorization"), body)
+
+        try:
+            stored = await run_in_threadpool(self.store.begin, key, digest)
+        except KeyMismatch:
+            await send_error(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        except KeyInUse:
+            await send_error(send, 409, "A request with this Idempotency-Key is still in progress",
+                             [(b"retry-after", b"1")])
+            return
+        if stored is not None:
+            await send({"type": "http.response.start", "status": stored.status,
+                        "headers": [(b"content-type", stored.content_type.encode()),
+                                    (b"content-length", str(len(stored.body)).encode()),
+                                    (b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"status": 500, "content_type": "application/json", "body": []}
+
+        async def record_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["content_type"] = dict(message.get("headers", [])).get(
+                    b"content-type", b"application/json").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, record_send)
+        finally:
+            # also on errors, so a failed create releases its key for the retry
+            await run_in_threadpool(self.store.finish, key, digest, response["status"],
+                                    response["content_type"], b"".join(response["body"]))
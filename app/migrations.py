@@ -0,0 +1,310 @@
+"""Versioned schema migrations.
+
+Each migration is applied once, in order, and recorded in `schema_version`.
+All pending migrations run inside a single BEGIN IMMEDIATE transaction, so
+when several workers start at once one of them applies them and the others
+wait on the write lock and then find nothing left to do.
+
+    python -m app.migrations           # apply pending migrations
+    python -m app.migrations status    # list applied and pending migrations
+
+Migration 1 is the schema as it was before versioning, and every step up to
+the first versioned one is written to be safe on a database that already has
+it, so databases created by the old `create_all()` startup adopt cleanly.
+New migrations are appended to MIGRATIONS and must never be edited once
+released.
+"""
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from .db import get_engine
+from .search import init_search
+from .summary import backfill_summaries
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+)"""
+
+INITIAL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS owners (
+        id INTEGER NOT NULL,
+        username VARCHAR,
+        email VARCHAR,
+        hashed_password VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_owners_username ON owners (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_owners_email ON owners (email)",
+    """CREATE TABLE IF NOT EXISTS projects (
+        id INTEGER NOT NULL,
+        title VARCHAR,
+        description VARCHAR,
+        project_link VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS blog_posts (
+        id INTEGER NOT NULL,
+        title VARCHAR,
+        content TEXT,
+        author VARCHAR,
+        published INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER NOT NULL,
+        email VARCHAR,
+        x_link VARCHAR,
+        linkedin_link VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_email ON contacts (email)",
+]
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn, table, column, ddl_type):
+    if column not in table_columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}")
+
+
+def initial_schema(conn):
+    for statement in INITIAL_SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def blog_summary_columns(conn):
+    add_column(conn, "blog_posts", "excerpt", "VARCHAR")
+    add_column(conn, "blog_posts", "word_count", "INTEGER")
+    add_column(conn, "blog_posts", "reading_time", "INTEGER")
+
+
+def blog_search_index(conn):
+    init_search(conn)
+
+
+def blog_summary_backfill(conn):
+    backfill_summaries(Session(bind=conn))
+
+
+def blog_published_at_column(conn):
+    add_column(conn, "blog_posts", "published_at", "DATETIME")
+    backfill_published_at(conn)
+
+
+def backfill_published_at(conn):
+    # the real publication time of older posts is unknown; stamping them with
+    # the upgrade time keeps them in published_after/published_before ranges
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    conn.exec_driver_sql("UPDATE blog_posts SET published_at = ? WHERE published = 1 AND published_at IS NULL",
+                         (now,))
+
+
+def blog_listing_indexes(conn):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_blog_posts_published_id ON blog_posts (published, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_blog_posts_author_id ON blog_posts (author, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_blog_posts_published_at ON blog_posts (published_at) "
+                         "WHERE published_at IS NOT NULL")
+
+
+def throttle_buckets(conn):
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS throttle_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL
+    )""")
+
+
+def cache_versions(conn):
+    from .coherence import VERSIONED_TABLES
+
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS cache_versions (
+        entity TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        row_id INTEGER
+    )""")
+    for entity, table in VERSIONED_TABLES.items():
+        conn.exec_driver_sql("INSERT OR IGNORE INTO cache_versions (entity) VALUES (?)", (entity,))
+        for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE cache_versions SET version = version + 1, row_id = {row}.id
+                    WHERE entity = '{entity}';
+                END""")
+
+
+def blog_html_columns(conn):
+    # existing posts are rendered by render.rerender_stale() at startup
+    add_column(conn, "blog_posts", "content_html", "TEXT")
+    add_column(conn, "blog_posts", "content_hash", "VARCHAR")
+    add_column(conn, "blog_posts", "html_renderer", "INTEGER")
+
+
+def change_log(conn):
+    tables = {"projects": "projects", "blogs": "blog_posts", "contacts": "contacts"}
+    # rows written before this migration keep NULL timestamps: their real
+    # creation time is unknown
+    for table in tables.values():
+        add_column(conn, table, "created_at", "DATETIME")
+        add_column(conn, table, "updated_at", "DATETIME")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    )""")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_changes_entity_row ON changes (entity, row_id)")
+    # Each write replaces the row's previous entry, so the log holds one entry
+    # per live row plus one tombstone per deleted row, and AUTOINCREMENT never
+    # hands out a seq twice. Triggers also cover bulk imports and delete_all_*.
+    for entity, table in tables.items():
+        for event, row, op in (("INSERT", "new", "upsert"), ("UPDATE", "new", "upsert"), ("DELETE", "old", "delete")):
+            conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    DELETE FROM changes WHERE entity = '{entity}' AND row_id = {row}.id;
+                    INSERT INTO changes (entity, row_id, op) VALUES ('{entity}', {row}.id, '{op}');
+                END""")
+
+
+def idempotency_keys(conn):
+    # status is NULL while the first request with the key is still running
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        status INTEGER,
+        content_type TEXT,
+        body BLOB,
+        created REAL NOT NULL
+    )""")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created ON idempotency_keys (created)")
+
+
+def visible_update_triggers(conn):
+    # Only updates of columns the API serves bump cache_versions and the change
+    # log; derived columns (the summary and rendered HTML, updated_at) follow
+    # those and are rewritten in bulk by backfills and re-renders.
+    visible = {
+        "projects": ("projects", "title, description, project_link"),
+        "blogs": ("blog_posts", "title, content, author, published, published_at"),
+        "contacts": ("contacts", "email, x_link, linkedin_link"),
+    }
+    for entity, (table, columns) in visible.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_version_update")
+        conn.exec_driver_sql(f"""CREATE TRIGGER {table}_version_update
+            AFTER UPDATE OF {columns} ON {table} BEGIN
+                UPDATE cache_versions SET version = version + 1, row_id = new.id
+                WHERE entity = '{entity}';
+            END""")
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_changes_update")
+        conn.exec_driver_sql(f"""CREATE TRIGGER {table}_changes_update
+            AFTER UPDATE OF {columns} ON {table} BEGIN
+                DELETE FROM changes WHERE entity = '{entity}' AND row_id = new.id;
+                INSERT INTO changes (entity, row_id, op) VALUES ('{entity}', new.id, 'upsert');
+            END""")
+
+
+def blog_summary_refresh(conn):
+    # excerpts are now taken from the markdown-it token stream; redo the ones
+    # made by the earlier regex, which also stripped characters from prose
+    conn.exec_driver_sql("UPDATE blog_posts SET word_count = NULL")
+    backfill_summaries(Session(bind=conn))
+
+
+def change_log_seed(conn):
+    # rows written before the change log existed get one upsert each, so a
+    # consumer syncing from since=0 also sees them
+    for entity, table in (("projects", "projects"), ("blogs", "blog_posts"), ("contacts", "contacts")):
+        conn.exec_driver_sql(f"""INSERT INTO changes (entity, row_id, op)
+            SELECT '{entity}', id, 'upsert' FROM {table}
+            WHERE id NOT IN (SELECT row_id FROM changes WHERE entity = '{entity}')
+            ORDER BY id""")
+
+
+def blog_published_at_backfill(conn):
+    # for databases that ran migration 5 before it backfilled
+    backfill_published_at(conn)
+
+
+# (version, name, apply(connection)); append only
+MIGRATIONS = [
+    (1, "initial schema", initial_schema),
+    (2, "blog summary columns", blog_summary_columns),
+    (3, "blog search index", blog_search_index),
+    (4, "blog summary backfill", blog_summary_backfill),
+    (5, "blog published_at column", blog_published_at_column),
+    (6, "blog listing indexes", blog_listing_indexes),
+    (7, "throttle buckets", throttle_buckets),
+    (8, "cache versions", cache_versions),
+    (9, "blog html columns", blog_html_columns),
+    (10, "change log", change_log),
+    (11, "idempotency keys", idempotency_keys),
+    (12, "visible update triggers", visible_update_triggers),
+    (13, "blog summary refresh", blog_summary_refresh),
+    (14, "change log seed", change_log_seed),
+    (15, "blog published_at backfill", blog_published_at_backfill),
+]
+
+
+def applied_versions(conn):
+    conn.exec_driver_sql(SCHEMA_VERSION_DDL)
+    return {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_version")}
+
+
+def pending_migrations(conn):
+    applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def migrate(engine=None):
+    """Apply every pending migration. Returns the versions that were applied."""
+    engine = engine or get_engine()
+    # autocommit stops the driver from opening its own transaction, so the
+    # explicit BEGIN IMMEDIATE takes the write lock before anything is read
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            applied = []
+            for version, name, apply in pending_migrations(conn):
+                apply(conn)
+                conn.exec_driver_sql(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.now(timezone.utc).isoformat()))
+                applied.append(version)
+            conn.exec_driver_sql("COMMIT")
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+    return applied
+
+
+def status(engine=None):
+    """Return (version, name, applied_at or None) for every known migration."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA_VERSION_DDL)
+        applied = dict(conn.exec_driver_sql("SELECT version, applied_at FROM schema_version").all())
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+
+def main(argv):
+    if argv[:1] == ["status"]:
+        for version, name, applied_at in status():
+            print(f"{version:>4}  {applied_at or 'pending':<32}  {name}")
+        return 0
+    if argv:
+        print("usage: python -m app.migrations [status]", file=sys.stderr)
+        return 2
+    applied = migrate()
+    print(f"applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
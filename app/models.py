@@ -1,5 +1,13 @@
+from datetime import datetime, timezone
+
 from .db import Base
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.orm import deferred
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class Owner(Base):
     __tablename__ = "owners"
@@ -17,6 +25,8 @@ class Project(Base):
     title = Column(String)
     description = Column(String)
     project_link = Column(String)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
     
     
 class Blog(Base):
@@ -27,6 +37,26 @@ class Blog(Base):
     content = Column(Text)
     author = Column(String)
     published = Column(Integer)
+    # UTC, set by crud when a post is published and cleared when it is unpublished
+    published_at = Column(DateTime)
+    # derived from content by app.summary, served by the summary listing
+    excerpt = Column(String)
+    word_count = Column(Integer)
+    reading_time = Column(Integer)
+    # content rendered by app.render; only loaded when HTML is requested
+    content_html = deferred(Column(Text))
+    content_hash = Column(String)
+    html_renderer = Column(Integer)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    # the filtered listings in crud.get_all_blogs are keyset-paginated on id,
+    # so each filter column is indexed together with it
+    __table_args__ = (
+        Index("ix_blog_posts_published_id", "published", "id"),
+        Index("ix_blog_posts_author_id", "author", "id"),
+        Index("ix_blog_posts_published_at", "published_at", sqlite_where=published_at.isnot(None)),
+    )
     
 class Contact_Info(Base):
     __tablename__ ="contacts"
@@ -35,4 +65,6 @@ class Contact_Info(Base):
     email = Column(String, index=True)
     x_link = Column(String)
     linkedin_link = Column(String)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
     
\ No newline at end of file
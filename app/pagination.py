@@ -0,0 +1,101 @@
+import base64
+import json
+from dataclasses import make_dataclass
+from functools import lru_cache
+
+from sqlalchemy import select, tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(sort, value, row_id):
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    # a cursor is only meaningful for the ordering it was issued under
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise ValueError("Cursor does not match sort order")
+    return value, row_id
+
+
+def parse_fields(model, fields):
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    columns = model.__table__.columns
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+@lru_cache(maxsize=None)
+def row_type(name, fields):
+    """A slotted dataclass with `fields`: small per row, and orjson serializes it natively."""
+    return make_dataclass(name, fields, slots=True, frozen=True)
+
+
+def paginate(session, model, sort_fields, columns, where=(), limit=DEFAULT_LIMIT, cursor=None, sort="id",
+             fields=None):
+    """Return one keyset page of `model` rows matching `where` as (rows, next_cursor).
+
+    `sort` is a column name from `sort_fields`, optionally prefixed with "-"
+    for descending order. The primary key is always used as the tie-breaker so
+    the ordering is total and pages never overlap or skip rows.
+
+    Rows hold the `columns` names, or the `fields` projection when given. They
+    are read with a Core select and packed into row_type() instances rather
+    than ORM objects: list pages are read-only and go straight to the JSON
+    encoder, so identity-map and attribute instrumentation would be wasted.
+    """
+    descending = sort.startswith("-")
+    sort_name = sort.lstrip("-")
+    if sort_name not in sort_fields:
+        raise ValueError(f"Cannot sort by {sort_name}")
+
+    sort_column = getattr(model, sort_name)
+    id_column = model.id
+    use_tuple = sort_name != "id"
+    conditions = list(where)
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        if use_tuple:
+            key = tuple_(sort_column, id_column)
+            conditions.append(key < (value, row_id) if descending else key > (value, row_id))
+        else:
+            conditions.append(id_column < row_id if descending else id_column > row_id)
+
+    if descending:
+        order = [sort_column.desc(), id_column.desc()] if use_tuple else [id_column.desc()]
+    else:
+        order = [sort_column, id_column] if use_tuple else [id_column]
+
+    names = tuple(parse_fields(model, fields) or columns)
+    # id and the sort column are needed to build the next cursor; they are
+    # selected after the returned fields when a projection leaves them out
+    extra = [name for name in dict.fromkeys(("id", sort_name)) if name not in names]
+    selected = [getattr(model, name) for name in (*names, *extra)]
+    statement = select(*selected).where(*conditions).order_by(*order)
+
+    # fetch one extra row to know whether another page exists
+    rows = session.execute(statement.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(sort, last[sort_name], last["id"])
+
+    make_row = row_type(f"{model.__name__}Row", names)
+    if extra:
+        width = len(names)
+        return [make_row(*row[:width]) for row in rows], next_cursor
+    return [make_row(*row) for row in rows], next_cursor
@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+
+import orjson
+from sqlalchemy import select
+
+from . import models
+from .cache import CachedResponse
+from .config import DB_URL, SNAPSHOT_PATH, SNAPSHOT_BLOG_LIMIT
+from .db import IN_MEMORY, read_db_session
+from .summary import SUMMARY_FIELDS
+
+logger = logging.getLogger(__name__)
+
+HEADERS = [(b"content-type", b"application/json")]
+
+
+def _rows(session, statement):
+    return [dict(row) for row in session.execute(statement).mappings()]
+
+
+def load_projects(session):
+    return _rows(session, select(*models.Project.__table__.columns).order_by(models.Project.id))
+
+
+def load_blogs(session):
+    columns = [getattr(models.Blog, name) for name in SUMMARY_FIELDS.split(",")]
+    return _rows(session, select(*columns).where(models.Blog.published == 1)
+                 .order_by(models.Blog.id.desc()).limit(SNAPSHOT_BLOG_LIMIT))
+
+
+def load_contacts(session):
+    return _rows(session, select(*models.Contact_Info.__table__.columns).order_by(models.Contact_Info.id))
+
+
+# crud entity -> loader for that section of the document
+SECTIONS = {"projects": load_projects, "blogs": load_blogs, "contacts": load_contacts}
+
+
+def database_mtime():
+    path = DB_URL.split("///", 1)[-1]
+    times = [os.path.getmtime(p) for p in (path, path + "-wal") if os.path.exists(p)]
+    return max(times, default=None)
+
+
+class PortfolioSnapshot:
+    """The GET /portfolio document, rebuilt one section at a time.
+
+    crud calls `invalidate(entity)` after every write. That only bumps the
+    section's generation and drops the encoded document; the next read reloads
+    just the stale sections and re-encodes. Reads in between are a single
+    attribute load. The encoded document is also written to `path` so a
+    restarted worker can serve it without querying, as long as the database
+    has not changed since.
+    """
+
+    def __init__(self, path):
+        self.path = path if path and not IN_MEMORY else None
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.document = None
+        self.sections = {}
+        self.generations = dict.fromkeys(SECTIONS, 0)
+        # section -> generation its current contents were loaded at
+        self.built = {}
+
+    def invalidate(self, entity):
+        with self.lock:
+            if entity in self.generations:
+                self.generations[entity] += 1
+                self.document = None
+
+    def get(self):
+        return self.document
+
+    def rebuild(self):
+        """Return an up-to-date document, loading only the sections written since the last build."""
+        with self.rebuild_lock:
+            document = self.document
+            if document is not None:
+                return document
+            if not self.built:
+                self.load_file()
+            with self.lock:
+                stale = {name: generation for name, generation in self.generations.items()
+                         if self.built.get(name) != generation}
+            with read_db_session() as session:
+                fresh = {name: SECTIONS[name](session) for name in stale}
+            with self.lock:
+                self.sections.update(fresh)
+                self.built.update(stale)
+                document = CachedResponse(orjson.dumps(self.sections), HEADERS, "portfolio", None)
+                # a write that landed while the sections were loading leaves the
+                # document stale; serve it to this request but build again next time
+                current = self.built == self.generations
+                if current:
+                    self.document = document
+            if current and stale:
+                self.save_file(document.body)
+            return document
+
+    def load_file(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        changed = database_mtime()
+        if changed is None or os.path.getmtime(self.path) <= changed:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                sections = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            logger.warning("ignoring unreadable portfolio snapshot %s", self.path)
+            return
+        if set(sections) != set(SECTIONS):
+            return
+        with self.lock:
+            self.sections = sections
+            # sections written to since this process started are still stale
+            self.built = dict.fromkeys(SECTIONS, 0)
+
+    def save_file(self, body):
+        if self.path is None:
+            return
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.write(body)
+            os.replace(temp, self.path)
+        except OSError:
+            logger.warning("could not write portfolio snapshot %s", self.path, exc_info=True)
+
+
+portfolio_snapshot = PortfolioSnapshot(SNAPSHOT_PATH)
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from markdown_it import MarkdownIt
+from sqlalchemy import bindparam, column, or_, select, table, update
+
+from . import models
+from .config import RENDER_WORKERS
+from .db import db_session, read_db_session
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the options below change: stored HTML from an older version is
+# re-rendered by rerender_stale() at startup.
+RENDERER_VERSION = 1
+
+# html=False escapes any raw HTML in a post, and markdown-it refuses
+# javascript:, vbscript:, file: and non-image data: link targets, so the
+# output needs no separate sanitizer.
+_markdown = MarkdownIt("commonmark", {"html": False}).enable(["table", "strikethrough"])
+
+
+def content_hash(content):
+    return hashlib.sha256((content or "").encode()).hexdigest()
+
+
+def render_html(content):
+    return _markdown.render(content or "")
+
+
+def plain_text(content):
+    """Return the text of `content` with its Markdown syntax removed, one space between blocks.
+
+    Walks the same token stream render_html() renders, so only real syntax
+    goes: `a > b`, `snake_case` and literal tags in prose are kept as written.
+    """
+    parts = []
+    for token in _markdown.parse(content or ""):
+        if token.type == "inline":
+            for child in token.children:
+                if child.type in ("text", "code_inline", "image"):
+                    # an image's content is its alt text
+                    parts.append(child.content)
+                elif child.type in ("softbreak", "hardbreak"):
+                    parts.append(" ")
+        elif token.type in ("fence", "code_block"):
+            parts.append(token.content)
+        else:
+            continue
+        parts.append(" ")
+    return "".join(parts)
+
+
+def rendered(content, digest=None):
+    """Return the content_html, content_hash and html_renderer columns for `content`."""
+    return {"content_html": render_html(content), "content_hash": digest or content_hash(content),
+            "html_renderer": RENDERER_VERSION}
+
+
+def with_html(values, stored=None):
+    """Add the rendered HTML columns when `values` change the content.
+
+    `stored` is the row's current (content_hash, html_renderer); when it
+    already matches, the HTML is left as it is instead of rendered again.
+    """
+    if "content" not in values:
+        return values
+    digest = content_hash(values["content"])
+    if stored is not None and tuple(stored) == (digest, RENDERER_VERSION):
+        return values
+    return dict(values, **rendered(values["content"], digest))
+
+
+def is_current(row):
+    return row["html_renderer"] == RENDERER_VERSION and row["content_hash"] == content_hash(row["content"])
+
+
+# a bare view of blog_posts for the write-back: unlike models.Blog it has no
+# onupdate default for updated_at
+_html_columns = table("blog_posts", column("id"), column("content_html"), column("content_hash"),
+                      column("html_renderer"))
+
+
+def rerender_stale(batch_size=200, stop=None):
+    """Render blogs whose HTML is missing or from an older renderer. Returns the row count.
+
+    Rows are read on the read pool and rendered by RENDER_WORKERS threads; the
+    writer connection is only held for each batch's UPDATE. That UPDATE sets
+    nothing but the HTML columns, so updated_at and the change log are left
+    alone, and skips rows whose content was edited since they were read.
+    """
+    stale = or_(models.Blog.html_renderer.is_(None), models.Blog.html_renderer != RENDERER_VERSION)
+    write_back = (update(_html_columns)
+                  .where(_html_columns.c.id == bindparam("row_id"),
+                         _html_columns.c.content_hash.is_(bindparam("read_hash"))))
+    done = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render") as pool:
+        while stop is None or not stop.is_set():
+            with read_db_session() as session:
+                rows = session.execute(select(models.Blog.id, models.Blog.content, models.Blog.content_hash)
+                                       .where(stale, models.Blog.id > last_id)
+                                       .order_by(models.Blog.id).limit(batch_size)).all()
+            if not rows:
+                break
+            values = list(pool.map(
+                lambda row: dict(rendered(row.content), row_id=row.id, read_hash=row.content_hash), rows))
+            with db_session() as session:
+                done += session.execute(write_back, values).rowcount
+                session.commit()
+            last_id = rows[-1].id
+    if done:
+        logger.info("re-rendered HTML for %d blogs", done)
+    return done
+
+
+def rerender_in_background(stop=None):
+    """rerender_stale() for the lifespan task: failures are logged, never raised into shutdown."""
+    try:
+        rerender_stale(stop=stop)
+    except Exception:
+        logger.exception("could not re-render blog HTML; stale posts are rendered when read")
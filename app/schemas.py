@@ -1,4 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, EmailStr
 
 class Owner(BaseModel):
    username: str
@@ -12,14 +15,157 @@ class Project(BaseModel):
     project_link: str
     
 
+class ProjectUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    project_link: Optional[str] = None
+
+
 class Blog(BaseModel):
     title: str
     content: str
     author: str
     published: int = 0
-        
+    # defaults to the time the post is first published
+    published_at: Optional[datetime] = None
+
+
+class BlogUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    author: Optional[str] = None
+    published: Optional[int] = None
+    published_at: Optional[datetime] = None
+
+
 class Contact_Info(BaseModel):
     email: EmailStr
     x_link: str
     linkedin_link : str
-        
\ No newline at end of file
+
+
+class Contact_InfoUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    x_link: Optional[str] = None
+    linkedin_link: Optional[str] = None
+
+
+# Response models. They are built from ORM rows or the dicts returned by
+# UPDATE/DELETE ... RETURNING, and never include the owner's password hash.
+class OwnerOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    expires_in: int
+
+
+class ProjectOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    project_link: Optional[str]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ProjectPage(BaseModel):
+    items: List[ProjectOut]
+    next_cursor: Optional[str]
+
+
+class BlogOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    content: Optional[str]
+    author: Optional[str]
+    published: Optional[int]
+    published_at: Optional[datetime] = None
+    excerpt: Optional[str] = None
+    word_count: Optional[int] = None
+    reading_time: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class BlogHtmlOut(BlogOut):
+    content_html: Optional[str] = None
+
+
+class BlogPage(BaseModel):
+    items: List[BlogOut]
+    next_cursor: Optional[str]
+
+
+class BlogSummary(BaseModel):
+    id: int
+    title: Optional[str]
+    author: Optional[str]
+    published: Optional[int]
+    published_at: Optional[datetime] = None
+    excerpt: Optional[str] = None
+    word_count: Optional[int] = None
+    reading_time: Optional[int] = None
+
+
+class BlogSearchResult(BaseModel):
+    id: int
+    title: Optional[str]
+    author: Optional[str]
+    published: Optional[int]
+    title_highlight: Optional[str]
+    snippet: Optional[str]
+    rank: float
+
+
+class Contact_InfoOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: Optional[str]
+    x_link: Optional[str]
+    linkedin_link: Optional[str]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class BulkError(BaseModel):
+    index: int
+    errors: List[str]
+
+
+class BulkResult(BaseModel):
+    inserted: int
+    updated: int
+    errors: List[BulkError]
+
+
+class Portfolio(BaseModel):
+    projects: List[ProjectOut]
+    blogs: List[BlogSummary]
+    contacts: List[Contact_InfoOut]
+
+
+class Change(BaseModel):
+    seq: int
+    entity: str
+    id: int
+    op: str
+    changed_at: datetime
+    data: Optional[dict] = None
+
+
+class ChangePage(BaseModel):
+    changes: List[Change]
+    next_cursor: int
+    has_more: bool
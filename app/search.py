@@ -0,0 +1,73 @@
+import html
+
+from sqlalchemy import text
+
+# External-content FTS5 index over blog_posts. The triggers keep it in sync with
+# every insert/update/delete made through crud, including bulk deletes.
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS blog_posts_fts USING fts5(
+        title, content, author,
+        content='blog_posts', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS blog_posts_fts_ai AFTER INSERT ON blog_posts BEGIN
+        INSERT INTO blog_posts_fts(rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_posts_fts_ad AFTER DELETE ON blog_posts BEGIN
+        INSERT INTO blog_posts_fts(blog_posts_fts, rowid, title, content, author)
+        VALUES ('delete', old.id, old.title, old.content, old.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_posts_fts_au AFTER UPDATE OF title, content, author ON blog_posts BEGIN
+        INSERT INTO blog_posts_fts(blog_posts_fts, rowid, title, content, author)
+        VALUES ('delete', old.id, old.title, old.content, old.author);
+        INSERT INTO blog_posts_fts(rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author);
+    END""",
+]
+
+# FTS5 wraps matches in these control characters rather than <mark> tags, so
+# the post text around them can be HTML-escaped before the tags go in
+MARK_START, MARK_END = "\x02", "\x03"
+
+# bm25 column weights: title, content, author
+SEARCH_SQL = text("""
+    SELECT b.id, b.title, b.author, b.published,
+           highlight(blog_posts_fts, 0, char(2), char(3)) AS title_highlight,
+           snippet(blog_posts_fts, 1, char(2), char(3), '...', 16) AS snippet,
+           bm25(blog_posts_fts, 10.0, 1.0, 5.0) AS rank
+    FROM blog_posts_fts
+    JOIN blog_posts b ON b.id = blog_posts_fts.rowid
+    WHERE blog_posts_fts MATCH :query
+    ORDER BY rank
+    LIMIT :limit
+""")
+
+
+def init_search(conn):
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blog_posts_fts'"
+    )).first()
+    for statement in FTS_SCHEMA:
+        conn.execute(text(statement))
+    if not exists:
+        # index posts that were written before the index existed
+        conn.execute(text("INSERT INTO blog_posts_fts(blog_posts_fts) VALUES ('rebuild')"))
+
+
+def build_match_query(q):
+    # Quote every term so user input can never be parsed as FTS5 syntax;
+    # the terms are ANDed and the last one is matched as a prefix.
+    terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+
+def mark_matches(fragment):
+    """HTML-escape a highlight() or snippet() fragment and wrap its matches in <mark>."""
+    if fragment is None:
+        return None
+    return html.escape(fragment).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
@@ -0,0 +1,50 @@
+import math
+
+from sqlalchemy import bindparam, column, select, table, update
+
+from .config import EXCERPT_LENGTH, READING_WORDS_PER_MINUTE
+from .render import plain_text
+
+SUMMARY_FIELDS = "id,title,author,published,published_at,excerpt,word_count,reading_time"
+
+
+def summarize(content):
+    """Return the excerpt, word_count and reading_time columns for a blog's content."""
+    # links and images keep their text; headings, emphasis, quotes and code fences are dropped
+    text = " ".join(plain_text(content).split())
+    words = len(text.split())
+    excerpt = text
+    if len(text) > EXCERPT_LENGTH:
+        excerpt = text[:EXCERPT_LENGTH].rsplit(" ", 1)[0] + "..."
+    return {
+        "excerpt": excerpt,
+        "word_count": words,
+        "reading_time": max(1, math.ceil(words / READING_WORDS_PER_MINUTE)) if words else 0,
+    }
+
+
+def with_summary(values):
+    if "content" in values:
+        return dict(values, **summarize(values["content"]))
+    return values
+
+
+# Only the columns the backfill touches, not models.Blog: it runs from
+# migration 4, before later columns (and their onupdate defaults) exist.
+_blog_posts = table("blog_posts", column("id"), column("content"), column("excerpt"), column("word_count"),
+                    column("reading_time"))
+
+
+def backfill_summaries(session, batch_size=500):
+    """Fill the summary columns of blogs written before they existed. Returns the row count."""
+    done = 0
+    statement = update(_blog_posts).where(_blog_posts.c.id == bindparam("row_id"))
+    while True:
+        rows = session.execute(select(_blog_posts.c.id, _blog_posts.c.content)
+                               .where(_blog_posts.c.word_count.is_(None))
+                               .limit(batch_size)).all()
+        if not rows:
+            return done
+        session.execute(statement, [dict(summarize(content), row_id=blog_id) for blog_id, content in rows])
+        session.commit()
+        done += len(rows)
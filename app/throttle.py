@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from .config import (THROTTLE_ENABLED, LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE, SIGNUP_IP_BURST,
+                     SIGNUP_IP_PER_MINUTE, THROTTLE_USER_BURST, THROTTLE_USER_PER_MINUTE,
+                     THROTTLE_MAX_KEYS, THROTTLE_FLUSH_SECONDS)
+from .db import db_session
+
+logger = logging.getLogger(__name__)
+
+# action -> ((key kind, burst, refill per minute), ...)
+LIMITS = {
+    "login": (("ip", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE),
+              ("user", THROTTLE_USER_BURST, THROTTLE_USER_PER_MINUTE)),
+    "signup": (("ip", SIGNUP_IP_BURST, SIGNUP_IP_PER_MINUTE),
+               ("user", THROTTLE_USER_BURST, THROTTLE_USER_PER_MINUTE)),
+}
+# after this long untouched, every bucket is full again and need not be stored
+FULL_REFILL_SECONDS = max(burst * 60 / per_minute for limits in LIMITS.values()
+                          for _, burst, per_minute in limits)
+
+
+class Throttled(Exception):
+    """Raised when an attempt is over its limit; `retry_after` is in whole seconds."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """Thread-safe token buckets, least recently used first out past `max_keys`.
+
+    A bucket that is evicted or was never seen counts as full, so eviction can
+    only ever be generous. Times are wall clock so persisted buckets stay
+    meaningful across restarts.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        # key -> [tokens, updated]
+        self.buckets = OrderedDict()
+        self.dirty = set()
+        self.rejected = {}
+
+    def _level(self, key, burst, per_minute, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return float(burst)
+        tokens, updated = bucket
+        return min(float(burst), tokens + max(now - updated, 0.0) * per_minute / 60)
+
+    def take(self, action, limits, now=None):
+        """Take a token from every (key, burst, per_minute) bucket, or from none of them.
+
+        Returns 0 when the attempt is allowed, otherwise the seconds until it would be.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            levels = [(key, self._level(key, burst, per_minute, now), per_minute)
+                      for key, burst, per_minute in limits]
+            wait = max(((1 - tokens) * 60 / per_minute for _, tokens, per_minute in levels
+                        if tokens < 1), default=0)
+            if wait:
+                self.rejected[action] = self.rejected.get(action, 0) + 1
+                return wait
+            for key, tokens, _ in levels:
+                self.buckets[key] = [tokens - 1, now]
+                self.buckets.move_to_end(key)
+                self.dirty.add(key)
+            while len(self.buckets) > self.max_keys:
+                evicted, _ = self.buckets.popitem(last=False)
+                self.dirty.add(evicted)
+            return 0
+
+    def load(self, rows, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            for key, tokens, updated in rows:
+                if key not in self.buckets:
+                    self.buckets[key] = [tokens, min(updated, now)]
+
+    def drain_dirty(self):
+        """Return (changed buckets, keys that no longer have a bucket) since the last call."""
+        with self.lock:
+            keys, self.dirty = self.dirty, set()
+            changed = [(key, *self.buckets[key]) for key in keys if key in self.buckets]
+            removed = [key for key in keys if key not in self.buckets]
+        return changed, removed
+
+    def mark_dirty(self, keys):
+        with self.lock:
+            self.dirty.update(keys)
+
+
+limiter = TokenBucketLimiter(THROTTLE_MAX_KEYS)
+
+
+def check(action, ip, username):
+    """Raise Throttled if `ip` or `username` has used up its `action` attempts."""
+    if not THROTTLE_ENABLED:
+        return
+    limits = [(f"{action}:{kind}:{value}", burst, per_minute)
+              for (kind, burst, per_minute), value in zip(LIMITS[action], (ip, (username or "").lower()))]
+    wait = limiter.take(action, limits)
+    if wait:
+        raise Throttled(max(1, int(wait + 0.999)))
+
+
+def metrics_lines():
+    name = "auth_throttled_total"
+    lines = [f"# HELP {name} Login and signup attempts rejected by the rate limiter.",
+             f"# TYPE {name} counter"]
+    with limiter.lock:
+        for action in LIMITS:
+            lines.append(f'{name}{{action="{action}"}} {limiter.rejected.get(action, 0)}')
+    return lines
+
+
+def load_buckets():
+    with db_session() as session:
+        rows = session.execute(text("SELECT key, tokens, updated FROM throttle_buckets")).all()
+    limiter.load(rows)
+    return len(rows)
+
+
+def save_buckets():
+    changed, removed = limiter.drain_dirty()
+    if not changed and not removed:
+        return
+    try:
+        with db_session() as session:
+            if changed:
+                session.execute(text(
+                    "INSERT INTO throttle_buckets (key, tokens, updated) VALUES (:key, :tokens, :updated) "
+                    "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated"
+                ), [{"key": key, "tokens": tokens, "updated": updated} for key, tokens, updated in changed])
+            if removed:
+                session.execute(text("DELETE FROM throttle_buckets WHERE key = :key"),
+                                [{"key": key} for key in removed])
+            session.execute(text("DELETE FROM throttle_buckets WHERE updated < :cutoff"),
+                            {"cutoff": time.time() - FULL_REFILL_SECONDS})
+            session.commit()
+    except Exception:
+        # try again on the next flush
+        limiter.mark_dirty([key for key, *_ in changed] + removed)
+        raise
+
+
+async def flush_periodically():
+    while True:
+        await asyncio.sleep(THROTTLE_FLUSH_SECONDS)
+        try:
+            await run_in_threadpool(save_buckets)
+        except Exception:
+            logger.exception("could not persist throttle buckets")
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from .coherence import deferred_invalidations, invalidate_local
+from .config import WRITE_QUEUE, WRITE_BATCH_MAX, WRITE_BATCH_DELAY_MS
+from .db import get_engine, run_db
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Run queued crud writes on one thread, several per transaction.
+
+    Every write gets its own SAVEPOINT inside the batch's BEGIN IMMEDIATE
+    transaction, so the crud functions' own commits only release their
+    savepoint and a failing write rolls back alone. The caller's future gets
+    the write's result or exception once the whole batch has committed, and
+    cache invalidations are applied only then.
+    """
+
+    def __init__(self, max_batch, max_delay):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="write-queue", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join()
+
+    async def submit(self, fn, *args, **kwargs):
+        """Queue `fn(session, *args, **kwargs)` and return its result once committed."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put((fn, args, kwargs, loop, future))
+        return await future
+
+    def next_batch(self):
+        first = self.queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self.next_batch()
+            if batch:
+                self.write_batch(batch)
+
+    def write_batch(self, batch):
+        outcomes = []
+        with deferred_invalidations() as invalidations:
+            try:
+                # autocommit hands transaction control to the explicit BEGIN
+                # IMMEDIATE, which also makes the driver's SAVEPOINTs behave
+                engine = get_engine()
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    transaction = conn.begin()
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                    try:
+                        for fn, args, kwargs, _, _ in batch:
+                            with Session(bind=conn, join_transaction_mode="create_savepoint",
+                                         autoflush=False, expire_on_commit=False) as session:
+                                try:
+                                    outcomes.append((fn(session, *args, **kwargs), None))
+                                except Exception as e:
+                                    session.rollback()
+                                    outcomes.append((None, e))
+                        transaction.commit()
+                    except BaseException:
+                        transaction.rollback()
+                        raise
+            except Exception as e:
+                logger.exception("write batch of %d failed", len(batch))
+                outcomes = [(None, e)] * len(batch)
+                invalidations.clear()
+        for entity, row_id in invalidations:
+            invalidate_local(entity, row_id)
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, _, _, loop, future), (result, error) in zip(batch, outcomes):
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+write_queue = WriteQueue(WRITE_BATCH_MAX, WRITE_BATCH_DELAY_MS / 1000) if WRITE_QUEUE else None
+
+
+async def run_write(session, fn, *args, **kwargs):
+    """Run a crud write on `session`, or through the group-commit queue when it is enabled."""
+    if write_queue is not None:
+        return await write_queue.submit(fn, *args, **kwargs)
+    return await run_db(session, fn, *args, **kwargs)
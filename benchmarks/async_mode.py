@@ -0,0 +1,90 @@
+"""Compare the threadpool request path with the async engine path.
+
+Each mode runs in its own subprocess (the mode is fixed at import time) against
+a fresh SQLite file, driving the app in-process through httpx's ASGI transport:
+
+    python benchmarks/async_mode.py --requests 2000 --concurrency 1 50 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def drive(requests, concurrency, seed):
+    import httpx
+    import main
+    from app.migrations import migrate
+
+    migrate()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/signup", json={"username": "bench", "email": "bench@example.com",
+                                           "password": "bench"})
+        login = await client.post("/login", data={"username": "bench", "password": "bench"})
+        client.headers["Authorization"] = "Bearer " + login.json()["access_token"]
+        for i in range(seed):
+            await client.post("/blogs/", json={"title": f"post {i}", "content": "lorem ipsum " * 50,
+                                               "author": "bench", "published": 1})
+        results = {}
+        for level in concurrency:
+            queue = iter(range(requests))
+            latencies = []
+
+            async def worker():
+                for i in queue:
+                    start = time.perf_counter()
+                    response = await client.get(f"/blogs/{i % seed + 1}")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(level)))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            results[level] = {
+                "rps": round(requests / elapsed, 1),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+            }
+    await main.dispose_engines()
+    return results
+
+
+def run_mode(async_db, args):
+    env = dict(os.environ, PORTFOLIO_ASYNC_DB="1" if async_db else "0", PYTHONPATH=ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(args.requests), "--seed", str(args.seed),
+             "--concurrency", *map(str, args.concurrency)],
+            env=env, cwd=workdir, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 200])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(drive(args.requests, args.concurrency, args.seed))))
+        return
+
+    print(f"{'mode':<12}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, async_db in (("threadpool", False), ("async", True)):
+        for level, stats in run_mode(async_db, args).items():
+            print(f"{label:<12}{level:>8}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Multi-process check that no worker serves stale cached data after another worker writes.
+
+Starts several uvicorn servers, each its own process with its own caches,
+against one SQLite file. Each round warms the caches of every worker, writes
+through one worker, and then reads the changed data back from every worker:
+
+    python benchmarks/coherence.py --workers 3 --rounds 50
+
+Exits non-zero if any read after a completed write returned the old data.
+Run with PORTFOLIO_CACHE_COHERENCE=0 to see the check fail.
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(client, url, process):
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError(f"worker at {url} exited with {process.returncode}")
+        try:
+            client.get(url + "/portfolio")
+            return
+        except Exception:
+            time.sleep(0.05)
+    raise RuntimeError(f"worker at {url} did not start")
+
+
+def first_title(items):
+    return items[0]["title"] if items else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    import httpx
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=ROOT, PORTFOLIO_DB_URL=f"sqlite:///{workdir}/bench.db",
+               PORTFOLIO_TOKEN_SECRET="coherence-check", PORTFOLIO_BCRYPT_ROUNDS="4",
+               PORTFOLIO_THROTTLE="0", PORTFOLIO_SNAPSHOT_PATH="")
+    subprocess.run([sys.executable, "-m", "app.migrations"], env=env, cwd=ROOT, check=True,
+                   capture_output=True)
+
+    urls, processes = [], []
+    try:
+        for _ in range(args.workers):
+            port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                env=env, cwd=ROOT))
+            urls.append(f"http://127.0.0.1:{port}")
+        client = httpx.Client(timeout=30)
+        for url, process in zip(urls, processes):
+            wait_ready(client, url, process)
+
+        client.post(urls[0] + "/signup", json={"username": "check", "email": "check@example.com",
+                                               "password": "check"})
+        token = client.post(urls[0] + "/login", data={"username": "check", "password": "check"}).json()
+        client.headers["Authorization"] = "Bearer " + token["access_token"]
+        blog = client.post(urls[0] + "/blogs/", json={"title": "v0", "content": "x", "author": "a",
+                                                       "published": 1}).json()
+        project = client.post(urls[0] + "/projects/", json={"title": "v0", "description": "d",
+                                                             "project_link": "l"}).json()
+
+        rng = random.Random(0)
+        stale = 0
+        for round_no in range(1, args.rounds + 1):
+            title = f"v{round_no}"
+            reads = {
+                "blog": lambda url: client.get(f"{url}/blogs/{blog['id']}").json()["title"],
+                "blog list": lambda url: first_title(client.get(f"{url}/blogs/").json()["items"]),
+                "project": lambda url: client.get(f"{url}/projects/{project['id']}").json()["title"],
+                "portfolio": lambda url: first_title(client.get(f"{url}/portfolio").json()["blogs"]),
+            }
+            for url in urls:
+                for read in reads.values():
+                    read(url)
+            writer = rng.choice(urls)
+            client.patch(f"{writer}/blogs/{blog['id']}", json={"title": title}).raise_for_status()
+            client.patch(f"{writer}/projects/{project['id']}", json={"title": title}).raise_for_status()
+            for url in urls:
+                for name, read in reads.items():
+                    seen = read(url)
+                    if seen != title:
+                        stale += 1
+                        print(f"round {round_no}: {name} on {url} returned {seen!r}, expected {title!r}")
+        reads_checked = args.rounds * len(urls) * 4
+        print(f"{args.workers} workers, {args.rounds} rounds, {reads_checked} reads after writes, "
+              f"{stale} stale")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    if stale:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
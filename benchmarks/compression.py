@@ -0,0 +1,66 @@
+"""CPU cost per request of compressed responses, with and without the variant cache.
+
+Seeds blogs, then repeatedly fetches the same `/blogs/` page in-process and
+reports process CPU time per request and the body size on the wire for:
+
+    identity          no compression
+    gzip middleware   starlette's GZipMiddleware recompressing every response
+    gzip/br/zstd      compressed once and served from the response cache
+
+    python benchmarks/compression.py --blogs 200 --limit 200 --requests 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blogs", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from fastapi.testclient import TestClient
+    from starlette.middleware.gzip import GZipMiddleware
+
+    import main as api
+    from app import compression
+    from app.db import db_session
+    from app.migrations import migrate
+    from benchmarks.seed import seed
+
+    migrate()
+    with db_session() as session:
+        seed(session, projects=0, blogs=args.blogs, contacts=0)
+
+    generic = GZipMiddleware(api.app, minimum_size=compression.COMPRESS_MIN_BYTES, compresslevel=9)
+    cases = [("identity", api.app, "identity"), ("gzip middleware", generic, "gzip")]
+    cases += [(f"{name} cached", api.app, name) for name in compression.PREFERENCE]
+    params = {"limit": args.limit}
+
+    print(f"{'mode':<18}{'cpu ms/req':>12}{'bytes':>10}")
+    for label, app, encoding in cases:
+        # the generic middleware must see plain responses from the app
+        compression.COMPRESSION_ENABLED = app is api.app
+        client = TestClient(app, headers={"Accept-Encoding": encoding})
+        response = client.get("/blogs/", params=params)
+        assert response.status_code == 200
+        size = int(response.headers["content-length"])
+        start = time.process_time()
+        for _ in range(args.requests):
+            client.get("/blogs/", params=params)
+        cpu = (time.process_time() - start) / args.requests
+        print(f"{label:<18}{cpu * 1000:12.3f}{size:10d}")
+
+
+if __name__ == "__main__":
+    main()
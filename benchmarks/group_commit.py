@@ -0,0 +1,107 @@
+"""Writes per second with and without the group-commit write queue.
+
+Each mode runs in its own subprocess (the queue is configured at import time)
+against a fresh SQLite file. Clients create, patch and delete projects
+through httpx's ASGI transport:
+
+    python benchmarks/group_commit.py --writes 2000 --concurrency 1 8 64
+
+--synchronous defaults to FULL so every commit waits for an fsync, as it
+does for deployments that cannot lose acknowledged writes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def drive(writes, concurrency):
+    import httpx
+    import main
+    from app.migrations import migrate
+    from app.writequeue import write_queue
+
+    migrate()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/signup", json={"username": "bench", "email": "bench@example.com",
+                                           "password": "bench"})
+        login = await client.post("/login", data={"username": "bench", "password": "bench"})
+        client.headers["Authorization"] = "Bearer " + login.json()["access_token"]
+
+        results = {}
+        for level in concurrency:
+            queue = iter(range(writes))
+            latencies = []
+
+            async def worker():
+                for i in queue:
+                    start = time.perf_counter()
+                    if i % 3 == 0:
+                        response = await client.post("/projects/", json={
+                            "title": f"project {i}", "description": "bench", "project_link": "link"})
+                    elif i % 3 == 1:
+                        response = await client.patch(f"/projects/{i // 3 + 1}", json={"title": f"edit {i}"})
+                    else:
+                        response = await client.delete(f"/projects/{i // 3 + 1}")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code in (200, 404), response.text
+
+            batches = write_queue.batches if write_queue else 0
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(level)))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            results[level] = {
+                "writes_per_second": round(writes / elapsed, 1),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+                "writes_per_batch": round(writes / (write_queue.batches - batches), 1) if write_queue else 1.0,
+            }
+    if write_queue is not None:
+        write_queue.stop()
+    await main.dispose_engines()
+    return results
+
+
+def run_mode(queued, args):
+    env = dict(os.environ, PORTFOLIO_WRITE_QUEUE="1" if queued else "0", PYTHONPATH=ROOT,
+               PORTFOLIO_DB_SYNCHRONOUS=args.synchronous, PORTFOLIO_BCRYPT_ROUNDS="4",
+               PORTFOLIO_CACHE_COHERENCE="0")
+    with tempfile.TemporaryDirectory() as workdir:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--writes", str(args.writes),
+             "--concurrency", *map(str, args.concurrency)],
+            env=env, cwd=workdir, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--synchronous", default="FULL")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = asyncio.run(drive(args.writes, args.concurrency))
+        print(json.dumps(results))
+        return
+
+    print(f"{'mode':<14}{'clients':>8}{'writes/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'per batch':>11}")
+    for queued in (False, True):
+        for level, r in run_mode(queued, args).items():
+            print(f"{'group commit' if queued else 'direct':<14}{level:>8}{r['writes_per_second']:>10}"
+                  f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['writes_per_batch']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Latency and memory of the Core list read path against ORM hydration.
+
+Seeds a throwaway database with --rows projects and blogs, then walks each
+table page by page (keyset pagination, --limit rows per page) two ways and
+serializes every page to JSON as the list endpoints do:
+
+    orm     session.query() ORM instances validated by the response model
+            (how /projects/ and /blogs/ were served before)
+    core    crud.get_all_* : Core select() into slotted rows, straight to orjson
+
+    python benchmarks/list_read_path.py --rows 50000 --limit 500
+
+Memory is the tracemalloc peak while building and serializing one page.
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def orm_page(session, model, limit, after):
+    # the ORM path as it was: identity-mapped instances, then pydantic
+    rows = (session.query(model).filter(model.id > after).order_by(model.id)
+            .limit(limit + 1).all())
+    more = len(rows) > limit
+    return rows[:limit], (rows[limit - 1].id if more else None)
+
+
+def walk(session, read_page, serialize, trace=False):
+    """Read and serialize every page; return (seconds, pages, peak bytes for one page, bytes written).
+
+    tracemalloc slows allocation down a lot, so timings come from untraced walks.
+    """
+    after, pages, peak, written = 0, 0, 0, 0
+    elapsed = 0.0
+    while after is not None:
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        rows, after = read_page(after)
+        written += len(serialize(rows))
+        elapsed += time.perf_counter() - start
+        if trace:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        del rows
+        session.expunge_all()
+        pages += 1
+    return elapsed, pages, peak, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("PORTFOLIO_BCRYPT_ROUNDS", "4")
+    sys.path.insert(0, ROOT)
+    import orjson
+
+    from app import crud, models, schemas
+    from app.db import db_session, read_db_session
+    from app.migrations import migrate
+    from app.pagination import encode_cursor
+    from benchmarks.seed import seed
+
+    migrate()
+    with db_session() as session:
+        seed(session, projects=args.rows, blogs=args.rows, contacts=0)
+
+    tables = [
+        ("projects", models.Project, schemas.ProjectPage, crud.get_all_projects),
+        ("blogs", models.Blog, schemas.BlogPage, crud.get_all_blogs),
+    ]
+    print(f"{args.rows} rows per table, {args.limit} per page, best of {args.repeat}")
+    print(f"{'table':<10}{'path':<6}{'total s':>9}{'ms/page':>9}{'peak KiB/page':>15}{'MiB out':>9}")
+    for name, model, page_schema, list_fn in tables:
+        with read_db_session() as session:
+            def orm_read(after):
+                return orm_page(session, model, args.limit, after)
+
+            def orm_serialize(rows):
+                page = page_schema.model_validate({"items": rows, "next_cursor": None})
+                return orjson.dumps(page.model_dump(mode="json"))
+
+            def core_read(after):
+                cursor = encode_cursor("id", after, after) if after else None
+                rows, next_cursor = list_fn(session, limit=args.limit, cursor=cursor)
+                return rows, (rows[-1].id if next_cursor else None)
+
+            def core_serialize(rows):
+                return orjson.dumps({"items": rows, "next_cursor": None})
+
+            for path, read_page, serialize in (("orm", orm_read, orm_serialize),
+                                               ("core", core_read, core_serialize)):
+                elapsed, pages, _, written = min(walk(session, read_page, serialize)
+                                                 for _ in range(args.repeat))
+                peak = walk(session, read_page, serialize, trace=True)[2]
+                print(f"{name:<10}{path:<6}{elapsed:9.2f}{elapsed / pages * 1000:9.2f}"
+                      f"{peak / 1024:15.0f}{written / 2 ** 20:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
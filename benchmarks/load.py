@@ -0,0 +1,284 @@
+"""Load and latency benchmark that drives every route of the API in-process.
+
+Seeds a throwaway SQLite database, then sends a mixed read/write workload
+through httpx's ASGI transport and reports throughput, p50/p95/p99 latency
+and SQL statements per request for each route:
+
+    python -m benchmarks.load --blogs 5000 --requests 5000 --concurrency 32
+    python -m benchmarks.load --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load --baseline benchmarks/baseline.json
+
+With --baseline the run exits non-zero if any route's p95 latency or query
+count, or the overall throughput, regressed beyond --tolerance.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# statements executed on behalf of the request currently being driven
+query_counter = contextvars.ContextVar("query_counter", default=None)
+
+
+class State:
+    def __init__(self, rng, projects, blogs, contacts):
+        self.rng = rng
+        self.ids = {"projects": list(range(1, projects + 1)), "blogs": list(range(1, blogs + 1)),
+                    "contacts": list(range(1, contacts + 1))}
+        self.serial = 0
+
+    def pick(self, entity):
+        ids = self.ids[entity]
+        return self.rng.choice(ids) if ids else 1
+
+    def take(self, entity):
+        ids = self.ids[entity]
+        return ids.pop(self.rng.randrange(len(ids))) if ids else 1
+
+    def next(self):
+        self.serial += 1
+        return self.serial
+
+
+def scenarios():
+    """(route, kind, weight, build) where build(state) returns (method, url, request kwargs)."""
+    from benchmarks.seed import blog_values, contact_values, project_values
+
+    def new(make):
+        return lambda s: make(s.rng, 10**6 + s.next())
+
+    def signup(s):
+        n = s.next()
+        return "POST", "/signup", {"json": {"username": f"bench{n}", "email": f"bench{n}@example.com",
+                                            "password": "benchmark"}}
+
+    return [
+        ("GET /projects/", "read", 10, lambda s: ("GET", "/projects/", {"params": {"limit": 20}})),
+        ("GET /projects/{project_id}", "read", 10,
+         lambda s: ("GET", f"/projects/{s.pick('projects')}", {})),
+        ("GET /projects/export", "read", 0.2, lambda s: ("GET", "/projects/export", {})),
+        ("GET /blogs/", "read", 20, lambda s: ("GET", "/blogs/", {"params": {
+            "limit": 20, "view": s.rng.choice(("full", "summary"))}})),
+        ("GET /blogs/search", "read", 10, lambda s: ("GET", "/blogs/search", {"params": {
+            "q": s.rng.choice(("sqlite", "cache index", "async stream", "fast"))}})),
+        ("GET /blogs/export", "read", 0.2, lambda s: ("GET", "/blogs/export", {})),
+        ("GET /blogs/{blog_id}", "read", 30, lambda s: ("GET", f"/blogs/{s.pick('blogs')}", {})),
+        ("GET /portfolio", "read", 10, lambda s: ("GET", "/portfolio", {})),
+        ("GET /owner/me", "read", 5, lambda s: ("GET", "/owner/me", {})),
+        ("GET /metrics/hashing", "read", 0.5, lambda s: ("GET", "/metrics/hashing", {})),
+        ("POST /signup", "write", 0.5, signup),
+        ("POST /login", "write", 0.5, lambda s: ("POST", "/login", {"data": {
+            "username": "owner0", "password": "password0"}})),
+        ("POST /projects/", "write", 5, lambda s: ("POST", "/projects/", {"json": new(project_values)(s)})),
+        ("POST /projects/bulk", "write", 0.5, lambda s: ("POST", "/projects/bulk", {
+            "json": [new(project_values)(s) for _ in range(20)]})),
+        ("PUT /projects/{project_id}", "write", 3, lambda s: ("PUT", f"/projects/{s.pick('projects')}", {
+            "json": new(project_values)(s)})),
+        ("PATCH /projects/{project_id}", "write", 3, lambda s: ("PATCH", f"/projects/{s.pick('projects')}", {
+            "json": {"title": f"patched {s.next()}"}})),
+        ("DELETE /projects/{project_id}", "write", 1,
+         lambda s: ("DELETE", f"/projects/{s.take('projects')}", {})),
+        ("POST /blogs/", "write", 5, lambda s: ("POST", "/blogs/", {"json": new(blog_values)(s)})),
+        ("POST /blogs/bulk", "write", 0.5, lambda s: ("POST", "/blogs/bulk", {
+            "json": [new(blog_values)(s) for _ in range(20)]})),
+        ("PUT /blogs/{blog_id}", "write", 3, lambda s: ("PUT", f"/blogs/{s.pick('blogs')}", {
+            "json": new(blog_values)(s)})),
+        ("PATCH /blogs/{blog_id}", "write", 3, lambda s: ("PATCH", f"/blogs/{s.pick('blogs')}", {
+            "json": {"published": s.rng.randint(0, 1)}})),
+        ("DELETE /blogs/{blog_id}", "write", 1, lambda s: ("DELETE", f"/blogs/{s.take('blogs')}", {})),
+        ("POST /contacts/", "write", 1, lambda s: ("POST", "/contacts/", {"json": new(contact_values)(s)})),
+        ("POST /contacts/bulk", "write", 0.2, lambda s: ("POST", "/contacts/bulk", {
+            "json": [new(contact_values)(s) for _ in range(20)]})),
+        ("PUT /contacts/{contact_id}", "write", 1, lambda s: ("PUT", f"/contacts/{s.pick('contacts')}", {
+            "json": new(contact_values)(s)})),
+        ("PATCH /contacts/{contact_id}", "write", 1, lambda s: ("PATCH", f"/contacts/{s.pick('contacts')}", {
+            "json": {"x_link": f"https://x.com/{s.next()}"}})),
+        ("DELETE /contacts/{contact_id}", "write", 0.5,
+         lambda s: ("DELETE", f"/contacts/{s.take('contacts')}", {})),
+    ]
+
+
+# destructive routes run once, after the mixed workload
+FINAL_ROUTES = [("DELETE /projects/", "DELETE", "/projects/"), ("DELETE /blogs/", "DELETE", "/blogs/")]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(samples, elapsed=None):
+    latencies = sorted(latency for latency, _, _ in samples)
+    report = {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 500),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "queries_per_request": round(sum(q for _, q, _ in samples) / len(samples), 2) if samples else 0,
+    }
+    if elapsed:
+        report["throughput_rps"] = round(len(samples) / elapsed, 1)
+    return report
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy import event
+
+    import main as api
+    from app.db import db_session, on_engine_created
+    from app.migrations import migrate
+    from benchmarks.seed import seed
+
+    def count_query(*_):
+        counter = query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+    on_engine_created(lambda each: event.listen(each, "before_cursor_execute", count_query))
+    migrate()
+    with db_session() as session:
+        credentials = seed(session, args.owners, args.projects, args.blogs, args.contacts, args.seed)
+
+    rng = random.Random(args.seed)
+    state = State(rng, args.projects, args.blogs, args.contacts)
+    plan = scenarios()
+    reads = [p for p in plan if p[1] == "read"]
+    writes = [p for p in plan if p[1] == "write"]
+    samples = {route: [] for route, *_ in plan}
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        username, password = credentials[0]
+        login = await client.post("/login", data={"username": username, "password": password})
+        client.headers["Authorization"] = "Bearer " + login.json()["access_token"]
+
+        async def send(route, method, url, kwargs):
+            counter = [0]
+            token = query_counter.set(counter)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                await response.aread()
+            finally:
+                query_counter.reset(token)
+            return time.perf_counter() - start, counter[0], response.status_code
+
+        remaining = iter(range(args.requests))
+
+        async def worker():
+            for _ in remaining:
+                pool = writes if rng.random() < args.write_ratio else reads
+                route, _, _, build = rng.choices(pool, weights=[p[2] for p in pool])[0]
+                method, url, kwargs = build(state)
+                samples[route].append(await send(route, method, url, kwargs))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        for route, method, url in FINAL_ROUTES:
+            samples[route] = [await send(route, method, url, {})]
+
+    await api.dispose_engines()
+
+    routes = {route: summarize(route_samples) for route, route_samples in samples.items() if route_samples}
+    final = {route for route, *_ in FINAL_ROUTES}
+    mixed = [sample for route, route_samples in samples.items() if route not in final
+             for sample in route_samples]
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")},
+              "overall": summarize(mixed, elapsed), "routes": routes}
+
+    app_routes = {f"{method} {route.path}" for route in api.app.routes
+                  for method in getattr(route, "methods", ()) if method != "HEAD"}
+    report["uncovered_routes"] = sorted(app_routes - set(samples) - {"GET /openapi.json", "GET /docs",
+                                                                      "GET /redoc",
+                                                                      "GET /docs/oauth2-redirect"})
+    return report
+
+
+def compare(report, baseline, tolerance):
+    problems = []
+    old, new = baseline["overall"], report["overall"]
+    if new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+        problems.append(f"throughput {old['throughput_rps']} -> {new['throughput_rps']} req/s")
+    for route, stats in report["routes"].items():
+        before = baseline["routes"].get(route)
+        # latency of rarely sampled routes is too noisy to compare
+        if not before or stats["requests"] < 50:
+            continue
+        if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            problems.append(f"{route}: p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+        if stats["queries_per_request"] > before["queries_per_request"] + 0.5:
+            problems.append(f"{route}: queries/request {before['queries_per_request']} -> "
+                            f"{stats['queries_per_request']}")
+    return problems
+
+
+def print_report(report):
+    print(f"{'route':<34}{'reqs':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'5xx':>5}")
+    for route, stats in sorted(report["routes"].items()):
+        print(f"{route:<34}{stats['requests']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['queries_per_request']:>9}{stats['errors']:>5}")
+    overall = report["overall"]
+    print(f"\n{overall['requests']} requests, {overall['throughput_rps']} req/s, p50 {overall['p50_ms']} ms, "
+          f"p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms, "
+          f"{overall['queries_per_request']} queries/request")
+    if report["uncovered_routes"]:
+        print("routes without a scenario:", ", ".join(report["uncovered_routes"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owners", type=int, default=1)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--blogs", type=int, default=2000)
+    parser.add_argument("--contacts", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="bcrypt cost used for signup/login during the run")
+    parser.add_argument("--baseline", help="compare against this stored report")
+    parser.add_argument("--save-baseline", help="write this run's report to a JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["PORTFOLIO_BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # every request comes from one client and logs in as one owner
+    os.environ.setdefault("PORTFOLIO_THROTTLE", "0")
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print("\nno regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
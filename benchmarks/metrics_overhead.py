@@ -0,0 +1,44 @@
+"""Measure the cost of the metrics middleware and SQL hooks.
+
+Runs the load benchmark alternately with PORTFOLIO_METRICS=0 and =1 and
+compares median throughput and p50 latency:
+
+    python -m benchmarks.metrics_overhead --repeat 3 -- --requests 3000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_load(enabled, load_args):
+    env = dict(os.environ, PORTFOLIO_METRICS="1" if enabled else "0")
+    out = subprocess.run([sys.executable, "-m", "benchmarks.load", "--json", *load_args],
+                         env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)["overall"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("load_args", nargs="*", help="arguments passed to benchmarks.load")
+    args = parser.parse_args()
+
+    results = {False: [], True: []}
+    for _ in range(args.repeat):
+        for enabled in (False, True):
+            results[enabled].append(run_load(enabled, args.load_args))
+
+    rps = {k: statistics.median(r["throughput_rps"] for r in v) for k, v in results.items()}
+    p50 = {k: statistics.median(r["p50_ms"] for r in v) for k, v in results.items()}
+    print(f"metrics off: {rps[False]:.1f} req/s, p50 {p50[False]:.3f} ms")
+    print(f"metrics on:  {rps[True]:.1f} req/s, p50 {p50[True]:.3f} ms")
+    print(f"overhead:    {(1 - rps[True] / rps[False]) * 100:.1f}% throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Check that filtered blog listings are served by indexes, never by a full scan.
+
+Seeds a throwaway database, captures the SQL that `crud.get_all_blogs`
+actually emits for each filter combination (first and later pages, both sort
+directions, full and summary views) and runs EXPLAIN QUERY PLAN on it:
+
+    python benchmarks/query_plans.py --blogs 5000
+
+Exits non-zero if any filtered listing scans blog_posts.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def capture(engine, fn):
+    """Run fn() and return the (statement, parameters) pairs it executed."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def full_scans(engine, statement, parameters):
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    details = [row[-1] for row in plan]
+    # "SCAN blog_posts" reads every row; "SCAN ... USING INDEX" reads every index entry
+    return details, [d for d in details if d.startswith("SCAN blog_posts")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blogs", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, ROOT)
+    from app import crud, models
+    from app.db import db_session, get_read_engine
+    from app.migrations import migrate
+    from app.summary import SUMMARY_FIELDS
+    from benchmarks.seed import blog_values
+
+    migrate()
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    rows = []
+    for i in range(args.blogs):
+        values = dict(blog_values(rng, i), author=f"author{i % 20}", published=int(rng.random() < 0.7))
+        values["published_at"] = start + timedelta(hours=i) if values["published"] else None
+        rows.append((i, values))
+    with db_session() as session:
+        crud.bulk_save(session, models.Blog, "blogs", rows)
+
+    after, before = start + timedelta(days=10), start + timedelta(days=40)
+    filters = {
+        "published": {"published": 1},
+        "drafts": {"published": 0},
+        "author": {"author": "author3"},
+        "published by author": {"published": 1, "author": "author3"},
+        "date range": {"published_after": after, "published_before": before},
+        "published since": {"published": 1, "published_after": after},
+    }
+    engine = get_read_engine()
+    failures = 0
+    with db_session() as session:
+        for label, kwargs in filters.items():
+            for sort in ("id", "-id"):
+                for fields in (None, SUMMARY_FIELDS):
+                    _, cursor = crud.get_all_blogs(session, limit=20, sort=sort, fields=fields, **kwargs)
+                    for page, page_cursor in (("first", None), ("next", cursor)):
+                        statements = capture(session.get_bind(), lambda: crud.get_all_blogs(
+                            session, limit=20, cursor=page_cursor, sort=sort, fields=fields, **kwargs))
+                        for statement, parameters in statements:
+                            details, scans = full_scans(engine, statement, parameters)
+                            view = "summary" if fields else "full"
+                            status = "FULL SCAN" if scans else "ok"
+                            print(f"{status:<10}{label:<22}{sort:<5}{view:<9}{page:<6}{'; '.join(details)}")
+                            failures += bool(scans)
+    if failures:
+        print(f"{failures} filtered listing(s) scan blog_posts", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Seed a database with synthetic portfolio content for benchmarks."""
+import random
+
+WORDS = ("sqlite fastapi python portfolio design cache index query async stream latency "
+         "deploy review profile schema token worker pool budget metric").split()
+
+
+def paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def project_values(rng, i):
+    return {"title": f"Project {i} {rng.choice(WORDS)}", "description": paragraph(rng, 30),
+            "project_link": f"https://example.com/projects/{i}"}
+
+
+def blog_values(rng, i, words=400):
+    return {"title": f"Post {i} about {rng.choice(WORDS)}", "content": paragraph(rng, words),
+            "author": rng.choice(("steve", "ada", "grace")), "published": int(rng.random() < 0.8)}
+
+
+def contact_values(rng, i):
+    return {"email": f"contact{i}@example.com", "x_link": f"https://x.com/user{i}",
+            "linkedin_link": f"https://linkedin.com/in/user{i}"}
+
+
+def seed(session, owners=1, projects=100, blogs=1000, contacts=10, seed_value=0):
+    """Insert the requested volumes through the bulk crud path and return the owner credentials."""
+    from app import crud, models, schemas
+    from app.hashing import get_pwd_context
+
+    rng = random.Random(seed_value)
+    credentials = []
+    for i in range(owners):
+        owner = schemas.Owner(username=f"owner{i}", email=f"owner{i}@example.com", password=f"password{i}")
+        crud.create_owner(session, owner, get_pwd_context().hash(owner.password))
+        credentials.append((owner.username, owner.password))
+    for model, entity, count, make in ((models.Project, "projects", projects, project_values),
+                                       (models.Blog, "blogs", blogs, blog_values),
+                                       (models.Contact_Info, "contacts", contacts, contact_values)):
+        for start in range(0, count, 1000):
+            rows = [(i, make(rng, i)) for i in range(start, min(start + 1000, count))]
+            crud.bulk_save(session, model, entity, rows)
+    return credentials
@@ -0,0 +1,64 @@
+"""Compare the old generic jsonable_encoder + JSONResponse path with typed response models + orjson.
+
+Builds a page of ORM Blog rows in memory and serializes it both ways, the
+way FastAPI does for an endpoint without and with a response_model:
+
+    python benchmarks/serialization.py --rows 5000 --words 400
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, ROOT)
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from app import models, schemas
+    from app.summary import summarize
+    from benchmarks.seed import blog_values
+
+    rng = random.Random(0)
+    blogs = []
+    for i in range(args.rows):
+        values = blog_values(rng, i, args.words)
+        blogs.append(models.Blog(id=i + 1, **values, **summarize(values["content"])))
+    page = {"items": blogs, "next_cursor": None}
+
+    def generic():
+        return JSONResponse(jsonable_encoder(page)).body
+
+    def typed():
+        content = schemas.BlogPage.model_validate(page).model_dump(mode="json")
+        return ORJSONResponse(content).body
+
+    old, old_size = best_of(generic, args.repeat)
+    new, new_size = best_of(typed, args.repeat)
+    print(f"{args.rows} blogs, ~{old_size // 1024} KiB body")
+    print(f"jsonable_encoder + JSONResponse: {old * 1000:8.1f} ms")
+    print(f"BlogPage + ORJSONResponse:       {new * 1000:8.1f} ms  ({old / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
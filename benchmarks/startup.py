@@ -0,0 +1,70 @@
+"""Cold-start benchmark: import time and time to the first served request.
+
+Each sample runs in a fresh interpreter, the way a new worker boots, and
+reports the median of:
+
+    import      `import main`; must not touch the database or load bcrypt
+    migrate     lifespan startup against a fresh database (all migrations)
+    warm start  lifespan startup against an up-to-date database
+    first GET   the first request after startup (opens the read pool)
+
+    python benchmarks/startup.py --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    touched = os.path.exists("precioussteve.db")
+    loaded = [name for name in ("bcrypt", "passlib.context") if name in sys.modules]
+
+    from fastapi.testclient import TestClient
+
+    timings = {"import": imported - start}
+    for label in ("migrate", "warm start"):
+        start = time.perf_counter()
+        with TestClient(main.app) as client:
+            started = time.perf_counter()
+            assert client.get("/projects/").status_code == 200
+            timings[label] = started - start
+            timings["first GET"] = time.perf_counter() - started
+    print(json.dumps({"timings": timings, "db_touched_on_import": touched, "loaded_on_import": loaded}))
+
+
+def sample():
+    with tempfile.TemporaryDirectory() as workdir:
+        out = subprocess.run([sys.executable, __file__, "--child"], env=dict(os.environ, PYTHONPATH=ROOT),
+                             cwd=workdir, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    samples = [sample() for _ in range(args.repeat)]
+    for label in samples[0]["timings"]:
+        median = statistics.median(s["timings"][label] for s in samples)
+        print(f"{label:<12}{median * 1000:10.1f} ms")
+    print(f"database touched on import: {any(s['db_touched_on_import'] for s in samples)}")
+    loaded = sorted({name for s in samples for name in s["loaded_on_import"]})
+    print(f"loaded on import: {', '.join(loaded) or 'nothing'}")
+
+
+if __name__ == "__main__":
+    main()
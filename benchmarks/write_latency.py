@@ -0,0 +1,89 @@
+"""Compare write latency of the old SELECT/commit/refresh crud path with UPDATE/DELETE ... RETURNING.
+
+Runs against a throwaway SQLite file in a temporary directory:
+
+    python benchmarks/write_latency.py --rows 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_edit_blog(session, models, blog_id, blog):
+    edit_blog = session.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    if not edit_blog:
+        return None
+    for key, value in blog.dict().items():
+        setattr(edit_blog, key, value)
+    session.commit()
+    session.refresh(edit_blog)
+    return edit_blog
+
+
+def legacy_delete_blog(session, models, blog_id):
+    blog = session.query(models.Blog).filter(models.Blog.id == blog_id).first()
+    if not blog:
+        return None
+    session.delete(blog)
+    session.commit()
+    return blog
+
+
+def measure(fn, ids):
+    timings = []
+    for row_id in ids:
+        start = time.perf_counter()
+        fn(row_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["PORTFOLIO_DB_URL"] = f"sqlite:///{workdir}/bench.db"
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import event
+    from app import crud, models, schemas
+    from app.db import get_engine, db_session
+    from app.migrations import migrate
+
+    engine = get_engine()
+    migrate(engine)
+    statements = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    session = db_session()
+    crud.bulk_save(session, models.Blog, "blogs",
+                   [(i, {"title": f"post {i}", "content": "lorem ipsum " * 100, "author": "bench",
+                         "published": 1}) for i in range(args.rows * 2)])
+    blog = schemas.Blog(title="edited", content="dolor sit amet " * 100, author="bench", published=1)
+    half = args.rows // 2
+    cases = [
+        ("PUT legacy", lambda i: legacy_edit_blog(session, models, i, blog), range(1, half + 1)),
+        ("PUT returning", lambda i: crud.edit_blog(session, i, blog), range(half + 1, args.rows + 1)),
+        ("PATCH returning", lambda i: crud.update_blog(session, i, {"title": "patched"}),
+         range(1, args.rows + 1)),
+        ("DELETE legacy", lambda i: legacy_delete_blog(session, models, i), range(1, args.rows + 1)),
+        ("DELETE returning", lambda i: crud.delete_blog(session, i),
+         range(args.rows + 1, args.rows * 2 + 1)),
+    ]
+    print(f"{'operation':<18}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'stmts/op':>10}")
+    for label, fn, ids in cases:
+        statements[0] = 0
+        mean, p50, p95 = measure(fn, ids)
+        print(f"{label:<18}{mean:>10.3f}{p50:>10.3f}{p95:>10.3f}{statements[0] / len(ids):>10.1f}")
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,36 +8,131 @@
 # SUBMISSION CRITERIA:
 # Submit your github repository link 
 
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List
 
-from app import models, schemas
-from app import crud
-from app.db import engine, db_session
-
-app = FastAPI()
-
-security_detail = OAuth2PasswordBearer(tokenUrl="login")
-
-models.Base.metadata.create_all(bind=engine)
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, Response
+from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 
-def get_session():
-    db = db_session()
+from app import models, schemas
+from app import crud, hashing, idempotency, throttle
+from app.export import export_response
+from app.bulk import bulk_import, BulkFormatError
+from app.compression import response_headers
+from app.coherence import version_watcher
+from app.middleware import (CoherenceMiddleware, IdempotencyMiddleware, ResponseCacheMiddleware, encode_entry,
+                            etag_matches)
+from app.metrics import MetricsMiddleware, instrument_engine, registry, hash_queue_lines
+from app.auth import create_access_token, get_cached_owner, require_owner, credentials_error
+from app.config import ASYNC_DB, TOKEN_TTL_SECONDS, METRICS_ENABLED, MIGRATE_ON_STARTUP, THROTTLE_PERSIST
+from app.db import db_session, read_db_session, run_db, run_db_read, run_db_write, dispose_engines, on_engine_created
+from app.migrations import migrate
+from app.pagination import DEFAULT_LIMIT, MAX_LIMIT
+from app.writequeue import run_write, write_queue
+from app.portfolio import portfolio_snapshot
+from app.render import rerender_in_background
+from app.summary import SUMMARY_FIELDS
+
+# Importing this module has no side effects: engines are created on first use
+# and the schema is brought up to date here, once per worker, before serving.
+@asynccontextmanager
+async def lifespan(app):
+    if MIGRATE_ON_STARTUP:
+        await run_in_threadpool(migrate)
+    if THROTTLE_PERSIST:
+        await run_in_threadpool(throttle.load_buckets)
+        flusher = asyncio.create_task(throttle.flush_periodically())
+    # stored HTML from an older renderer is redone in the background; reads
+    # render stale posts on the fly until then
+    stop_rendering = threading.Event()
+    rendering = asyncio.create_task(run_in_threadpool(rerender_in_background, stop=stop_rendering))
     try:
-        yield db
+        yield
     finally:
-        db.close()
+        stop_rendering.set()
+        await rendering
+        if THROTTLE_PERSIST:
+            flusher.cancel()
+            await run_in_threadpool(throttle.save_buckets)
+        if write_queue is not None:
+            write_queue.stop()
+        hashing.shutdown()
+        if version_watcher is not None:
+            version_watcher.close()
+        await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(ResponseCacheMiddleware)
+# outside the response cache, so stale entries are gone before it is consulted
+app.add_middleware(CoherenceMiddleware)
+# replays retried creates before routing, so they never reach validation or the database
+app.add_middleware(IdempotencyMiddleware)
+if METRICS_ENABLED:
+    # added last so it is outermost and also times responses served from the cache
+    app.add_middleware(MetricsMiddleware, router=app.router)
+    on_engine_created(instrument_engine)
+
+
+@app.exception_handler(hashing.HashQueueFull)
+async def hash_queue_full_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again shortly"},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(throttle.Throttled)
+async def throttled_handler(request, exc):
+    return JSONResponse(status_code=429, content={"detail": "Too many attempts, try again later"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+def client_ip(request):
+    return request.client.host if request.client else "unknown"
+
+if ASYNC_DB:
+    from app.db import async_db_session, async_read_db_session
+
+    def session_dependency(sessionmaker):
+        async def get_session():
+            async with sessionmaker() as db:
+                yield db
+        return get_session
+
+    get_session = session_dependency(async_db_session)
+    get_read_session = session_dependency(async_read_db_session)
+else:
+    def session_dependency(sessionmaker):
+        def get_session():
+            db = sessionmaker()
+            try:
+                yield db
+            finally:
+                db.close()
+        return get_session
+
+    # mutations use the single writer connection, GET endpoints the read-only pool
+    get_session = session_dependency(db_session)
+    get_read_session = session_dependency(read_db_session)
         
         
 
-@app.post("/signup")
-def create_owner(owner:schemas.Owner, session=Depends(get_session)):
-    existing_owner = crud.check_email(session, owner.email)
+@app.post("/signup", response_model=schemas.OwnerOut)
+async def create_owner(owner:schemas.Owner, request: Request):
+    throttle.check("signup", client_ip(request), owner.username)
+    # no request-scoped session: each query holds a connection only while it runs,
+    # never while the password is hashed
+    existing_owner = await run_db_read(crud.check_email, owner.email)
     if existing_owner:
         raise HTTPException(status_code=409,
                             detail="Owner already exists")
     else:
-        new_owner = crud.create_owner(session, owner)
+        hashed_password = await hashing.hash_password(owner.password)
+        new_owner = await run_db_write(crud.create_owner, owner, hashed_password)
     return new_owner
 
 """
@@ -48,23 +143,31 @@ def create_owner(owner:schemas.Owner, session=Depends(get_session)):
     is a Pydantic model representing the data structure of an owner. It contains information such
     as the owner's email, username, password. This parameter is used to create a new owner
     :type owner: schemas.Owner
-    :param session: The `session` parameter in the `create_owner` function is used to manage the
-    database session. It is a dependency that is injected into the function using
-    `Depends(get_session)`. This allows the function to interact with the database by executing queries
-    and transactions within the provided session context. 
+    :param request: used for the client IP the signup throttle counts against.
     :return: the newly created owner if the owner does not already exist in the database. If the owner
     already exists, it will raise an HTTPException with a status code of 409 and a detail message
-    indicating that the owner already exists.
+    indicating that the owner already exists. Too many signups from one client IP or for one username
+    are answered with 429 and a `Retry-After` header before anything is hashed.
+    The email check and the insert each run in their own short session, so no database connection
+    is held while the password is hashed.
 """
         
         
-@app.post("/login")
-def login_for_access_token(form_data:OAuth2PasswordRequestForm = Depends(), session = Depends(get_session)):
-    owner = crud.authenticate_owner(session, form_data.username, form_data.password)
+@app.post("/login", response_model=schemas.Token)
+async def login_for_access_token(request: Request, form_data:OAuth2PasswordRequestForm = Depends()):
+    throttle.check("login", client_ip(request), form_data.username)
+    # the lookup's session is closed before the password is verified
+    owner = await run_db_read(crud.get_owner_by_username, form_data.username)
     if not owner:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token = form_data.username
-    return {"access_token": access_token, "token_type": "bearer"}
+    valid, new_hash = await hashing.verify_password(form_data.password, owner.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    if new_hash:
+        # the stored hash used outdated parameters; upgrade it while we have the password
+        await run_db_write(crud.update_owner_password, owner, new_hash)
+    access_token = create_access_token(owner)
+    return {"access_token": access_token, "token_type": "bearer", "expires_in": TOKEN_TTL_SECONDS}
 
 """
     This endpoint handles user authentication for generating access tokens.
@@ -73,29 +176,63 @@ def login_for_access_token(form_data:OAuth2PasswordRequestForm = Depends(), sess
     when a user tries to log in. The `form_data` object will contain the username and password provided
     by
     :type form_data: OAuth2PasswordRequestForm
-    :param session: The `session` parameter in the `login_for_access_token` function is used to manage
-    the database session. It is obtained using the `Depends` function with the `get_session` dependency,
-    which likely provides a database session for interacting with the database within the function. 
-    :return: The code is returning a dictionary containing the access token and token type. The access
-    token is set to the username provided in the form data, and the token type is set to "bearer".
+    :param request: used for the client IP the login throttle counts against.
+    :return: The code is returning a dictionary containing the access token, the token type "bearer"
+    and the number of seconds until the token expires. The access token is a signed JWT (HS256)
+    carrying the owner's username and id, so later requests can be authenticated without a
+    database lookup. Too many attempts from one client IP or for one username are answered with 429
+    and a `Retry-After` header before the database is queried or the password is verified.
+    
+    The owner lookup and any re-hash each run in their own short session, so no database
+    connection is held while the password is verified. Password verification runs in the hashing
+    worker pool. If the stored hash was made with fewer
+    bcrypt rounds than configured it is transparently re-hashed on a successful login.
+"""
+
+
+@app.get("/metrics/hashing")
+async def hashing_metrics():
+    return hashing.queue_wait.snapshot()
+
+"""
+    This endpoint reports how long password hashes wait for a worker in the hashing pool.
+    
+    :return: a dictionary with the number of hashes run and rejected, how many are pending, the
+    average and maximum queue wait in seconds, and cumulative counts per wait bucket.
+"""
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(hash_queue_lines(hashing.queue_wait) + throttle.metrics_lines()
+                                             + idempotency.metrics_lines()),
+                             media_type="text/plain; version=0.0.4")
+
+"""
+    This endpoint exposes the API's metrics in the Prometheus text format.
+    
+    :return: request counts by route and status, request latency and SQL-statements-per-request
+    histograms by route, total SQL time by route, the number of slow statements, the password
+    hashing queue wait histogram, the number of throttled login and signup attempts, and the number
+    of creates replayed or rejected by their Idempotency-Key.
 """
 
 
 @app.get("/owner/me")
-def owners_me(token = Depends(security_detail), session = Depends(get_session)):
-    owner = crud.get_owner_by_username(session, token)
+async def owners_me(claims = Depends(require_owner), session = Depends(get_read_session)):
+    owner = await run_db(session, get_cached_owner, claims["sub"])
     if not owner:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    return {"message":f'Hello, {owner.username}'}
+        raise credentials_error()
+    return {"message":f'Hello, {owner["username"]}'}
 
 """
     The endpoint here retrieves the owner information based on the provided token and session,
     returning an HTTP 401 error if the owner is not found.
     
-    :param token: The `token` parameter in the `owners_me` function is obtained using the `Depends`
-    function with the `security_detail` dependency. This means that the `security_detail`
-    dependency is responsible for extracting and validating the token from the request. The token is
-    used to identify the user
+    :param claims: The `claims` parameter is obtained using the `require_owner` dependency, which
+    extracts the bearer token from the request and verifies its signature and expiry in memory.
+    The `sub` claim holds the owner's username. The owner record itself comes from a small TTL
+    cache, so the database is only queried on a cache miss
     :param session: The `session` parameter in the `owners_me` function is likely used to interact with
     the database session. It is obtained by calling the `get_session` dependency, which probably sets up
     and provides a database session for the function to use when querying the database.
@@ -106,9 +243,9 @@ def owners_me(token = Depends(security_detail), session = Depends(get_session)):
         
 
 # For projects
-@app.post("/projects/")
-def create_project(project: schemas.Project, session = Depends(get_session)):
-    return crud.create_project(session=session, project=project)
+@app.post("/projects/", dependencies=[Depends(require_owner)], response_model=schemas.ProjectOut)
+async def create_project(project: schemas.Project, session = Depends(get_session)):
+    return await run_write(session, crud.create_project, project=project)
 
 """
     This endpoint creates a new project using the provided project data in the database.
@@ -127,24 +264,77 @@ def create_project(project: schemas.Project, session = Depends(get_session)):
     success/failure of the creation process.
     """
 
-@app.get("/projects/")
-def read_projects(session = Depends(get_session)):
-    return crud.get_all_projects(session=session)
+
+@app.post("/projects/bulk", dependencies=[Depends(require_owner)], response_model=schemas.BulkResult)
+async def create_projects_bulk(request: Request, upsert_on: str = None,
+                               session = Depends(get_session)):
+    try:
+        return await bulk_import(request, session, schemas.Project, models.Project, "projects",
+                                 upsert_on)
+    except (ValueError, BulkFormatError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+"""
+    This endpoint creates many projects in one request.
+    
+    The body is either a JSON array of projects or, with a `Content-Type` of `application/x-ndjson`,
+    one project per line, which is read as a stream. Every item is validated like a single create,
+    and valid rows are written in batched transactions.
+    
+    :param upsert_on: Optionally one of `title` or `project_link`. Rows whose value for that column already exists
+    update the existing row instead of inserting a new one.
+    :return: a dictionary with the number of rows "inserted" and "updated", and "errors", a list of
+    the indexes of items that were not saved and why. Invalid items do not stop the rest of the batch.
+"""
+
+@app.get("/projects/", response_model=schemas.ProjectPage)
+async def read_projects(limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), cursor: str = None,
+                        sort: str = "id", fields: str = None, session = Depends(get_read_session)):
+    try:
+        projects, next_cursor = await run_db(session, crud.get_all_projects, limit=limit,
+                                             cursor=cursor, sort=sort, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # rows are slotted dataclasses with exactly the listed (or projected) columns
+    return ORJSONResponse({"items": projects, "next_cursor": next_cursor})
 
 """
-    This endpoint that retrieves all projects from a database using a session dependency.
+    This endpoint retrieves one page of projects from the database using keyset pagination.
     
+    :param limit: The maximum number of projects to return in this page.
+    :param cursor: The opaque `next_cursor` value returned by the previous page. Leave it out to
+    start from the first page.
+    :param sort: The column to sort by (`id` or `title`), prefixed with `-` for descending order.
+    The cursor is tied to the sort order it was issued with.
+    :param fields: A comma separated list of columns to return, e.g. `id,title`.
     :param session: The `session` parameter in the `read_projects` function is a dependency that is
-    injected using `Depends(get_session)`. This dependency is used to obtain a database session that
+    injected using `Depends(get_read_session)`. This dependency is used to obtain a database session that
     allows the function to interact with the database when retrieving all projects
-    :return: The code is returning all projects from the database by calling the `get_all_projects`
-    function from the `crud` module.
+    :return: a dictionary with the page of projects under "items" and the cursor for the next page
+    under "next_cursor", which is null on the last page. An invalid cursor, sort or field raises an
+    HTTPException with a status code of 400.
+"""
+
+
+@app.get("/projects/export")
+async def export_projects(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False):
+    return export_response(models.Project, "projects", format, compress=gzip)
+
+"""
+    This endpoint streams every project as a downloadable file, for backups and syncing.
+    
+    Rows are read from the database in chunks and written out as they arrive, so memory use
+    stays flat however large the table is.
+    
+    :param format: `ndjson` (one JSON object per line, the default) or `csv` with a header row.
+    :param gzip: Compress the stream on the fly and send it as a `.gz` file.
+    :return: a streaming response with a `Content-Disposition` attachment filename.
 """
 
 
-@app.get("/projects/{project_id}")
-def read_project(project_id: int, session = Depends(get_session)):
-    project = crud.get_single_project(session=session, project_id=project_id)
+@app.get("/projects/{project_id}", response_model=schemas.ProjectOut)
+async def read_project(project_id: int, session = Depends(get_read_session)):
+    project = await run_db(session, crud.get_single_project, project_id=project_id)
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
@@ -165,9 +355,9 @@ def read_project(project_id: int, session = Depends(get_session)):
 """
 
 
-@app.put("/projects/{project_id}")
-def update_project(project_id: int, project: schemas.Project, session = Depends(get_session)):
-    updated_project = crud.edit_project(session=session, project_id=project_id, project=project)
+@app.put("/projects/{project_id}", dependencies=[Depends(require_owner)], response_model=schemas.ProjectOut)
+async def update_project(project_id: int, project: schemas.Project, session = Depends(get_session)):
+    updated_project = await run_write(session, crud.edit_project, project_id=project_id, project=project)
     if updated_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     return updated_project
@@ -195,9 +385,33 @@ def update_project(project_id: int, project: schemas.Project, session = Depends(
 """
 
 
-@app.delete("/projects/{project_id}")
-def delete_project(project_id: int, session = Depends(get_session)):
-    deleted_project = crud.delete_project(session=session, project_id=project_id)
+@app.patch("/projects/{project_id}", dependencies=[Depends(require_owner)], response_model=schemas.ProjectOut)
+async def patch_project(project_id: int, project: schemas.ProjectUpdate, session = Depends(get_session)):
+    values = project.model_dump(exclude_unset=True, exclude_none=True)
+    updated_project = await run_write(session, crud.update_project, project_id, values)
+    if updated_project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return updated_project
+
+"""
+    This endpoint partially updates the project with the specified ID.
+    
+    Only the fields present in the request body are changed; fields that are left out (or sent as
+    null) keep their current value. The change and the updated row are read back in a single
+    `UPDATE ... RETURNING` statement.
+    
+    :param project_id: The unique identifier of the project to update, taken from the URL path.
+    :type project_id: int
+    :param project: The fields to change, as a `schemas.ProjectUpdate`.
+    :type project: schemas.ProjectUpdate
+    :return: the updated project. If the project is not found, it raises an HTTPException with a status
+    code of 404 and the detail message "Project not found".
+"""
+
+
+@app.delete("/projects/{project_id}", dependencies=[Depends(require_owner)], response_model=schemas.ProjectOut)
+async def delete_project(project_id: int, session = Depends(get_session)):
+    deleted_project = await run_write(session, crud.delete_project, project_id=project_id)
     if deleted_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     return deleted_project
@@ -219,9 +433,9 @@ def delete_project(project_id: int, session = Depends(get_session)):
 """
 
 
-@app.delete("/projects/")
-def delete_all_projects(session = Depends(get_session)):
-    crud.delete_all_projects(session=session)
+@app.delete("/projects/", dependencies=[Depends(require_owner)])
+async def delete_all_projects(session = Depends(get_session)):
+    await run_write(session, crud.delete_all_projects)
     return {"detail": "All projects deleted"}
 
 """
@@ -236,9 +450,9 @@ def delete_all_projects(session = Depends(get_session)):
 """
 
 # Blog
-@app.post("/blogs/")
-def create_blog(blog: schemas.Blog, session = Depends(get_session)):
-    return crud.create_blog(session=session, blog=blog)
+@app.post("/blogs/", dependencies=[Depends(require_owner)], response_model=schemas.BlogOut)
+async def create_blog(blog: schemas.Blog, session = Depends(get_session)):
+    return await run_write(session, crud.create_blog, blog=blog)
 """
     This endpoint creates a new blog by calling the `create_blog` function from the `crud` module
     with the provided blog data and session.
@@ -255,28 +469,115 @@ def create_blog(blog: schemas.Blog, session = Depends(get_session)):
 """
 
 
+@app.post("/blogs/bulk", dependencies=[Depends(require_owner)], response_model=schemas.BulkResult)
+async def create_blogs_bulk(request: Request, upsert_on: str = None, session = Depends(get_session)):
+    try:
+        return await bulk_import(request, session, schemas.Blog, models.Blog, "blogs",
+                                 upsert_on)
+    except (ValueError, BulkFormatError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/blogs/")
-def read_blogs(session = Depends(get_session)):
-    return crud.get_all_blogs(session=session)
 """
-    This endpoint retrieves all blogs from a database
-    using a session dependency.
+    This endpoint creates many blogs in one request.
+    
+    The body is either a JSON array of blogs or, with a `Content-Type` of `application/x-ndjson`,
+    one blog per line, which is read as a stream. Every item is validated like a single create,
+    and valid rows are written in batched transactions.
     
+    :param upsert_on: Optionally `title`. Rows whose value for that column already exists
+    update the existing row instead of inserting a new one.
+    :return: a dictionary with the number of rows "inserted" and "updated", and "errors", a list of
+    the indexes of items that were not saved and why. Invalid items do not stop the rest of the batch.
+"""
+
+@app.get("/blogs/", response_model=schemas.BlogPage)
+async def read_blogs(limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), cursor: str = None,
+                     sort: str = "id", fields: str = None,
+                     view: str = Query("full", pattern="^(full|summary)$"), published: int = None,
+                     author: str = None, published_after: datetime = None, published_before: datetime = None,
+                     session = Depends(get_read_session)):
+    if view == "summary" and not fields:
+        fields = SUMMARY_FIELDS
+    try:
+        blogs, next_cursor = await run_db(session, crud.get_all_blogs, limit=limit,
+                                          cursor=cursor, sort=sort, fields=fields, published=published,
+                                          author=author, published_after=published_after,
+                                          published_before=published_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # rows are slotted dataclasses with exactly the listed (or projected) columns; they go straight
+    # to orjson instead of being validated against schemas.BlogPage again
+    return ORJSONResponse({"items": blogs, "next_cursor": next_cursor})
+"""
+    This endpoint retrieves one page of blogs from the database using keyset pagination.
+    
+    :param limit: The maximum number of blogs to return in this page.
+    :param cursor: The opaque `next_cursor` value returned by the previous page.
+    :param sort: The column to sort by (`id`, `title`, `author` or `published`), prefixed with `-`
+    for descending order.
+    :param fields: A comma separated list of columns to return, e.g. `id,title,author`.
+    :param view: `full` (the default) or `summary`. The summary view never loads the post content and
+    returns each blog's id, title, author, published flag, excerpt, word count and reading time in
+    minutes instead. `fields` takes precedence when both are given.
+    :param published: Only return blogs with this published flag, e.g. `1` for the public site.
+    :param author: Only return blogs by this author.
+    :param published_after: Only return blogs published at or after this ISO 8601 date or time.
+    :param published_before: Only return blogs published before this ISO 8601 date or time. Drafts have
+    no publication date, so either date filter leaves them out.
     :param session: The `session` parameter in the `read_blogs` function is a dependency that is
-    injected using `Depends(get_session)`. This dependency is used to obtain a database session that
+    injected using `Depends(get_read_session)`. This dependency is used to obtain a database session that
     allows the function to interact with the database to retrieve all blogs using the
     `crud.get_all_blogs` function
-    :return: The code is returning all the blogs by calling the `get_all_blogs` function from the `crud`
-    module using the session provided as a dependency.
+    :return: a dictionary with the page of blogs under "items" and the cursor for the next page under
+    "next_cursor", which is null on the last page.
+"""
+
+
+@app.get("/blogs/search", response_model=List[schemas.BlogSearchResult])
+async def search_blogs(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100),
+                       session = Depends(get_read_session)):
+    return await run_db(session, crud.search_blogs, q=q, limit=limit)
+"""
+    This endpoint searches blog posts by title, content and author using the full-text index.
+    
+    :param q: The search terms. All terms must match and the last term also matches as a prefix,
+    so `fast api` finds posts containing "fast" and "api" or "apis".
+    :param limit: The maximum number of results to return.
+    :param session: The database session obtained using the `get_session` dependency.
+    :return: a list of matching blogs ranked by relevance (bm25, with title matches weighted
+    highest). Each result has the blog's id, title, author and published flag, the title with
+    matches wrapped in `<mark>` tags and a highlighted snippet of the content. Both are HTML: the post
+    text in them is escaped, so `<mark>` is the only markup.
+"""
+
+
+@app.get("/blogs/export")
+async def export_blogs(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False):
+    return export_response(models.Blog, "blogs", format, compress=gzip)
+
+"""
+    This endpoint streams every blog as a downloadable file, for backups and syncing.
+    
+    Rows are read from the database in chunks and written out as they arrive, so memory use
+    stays flat however large the table is.
+    
+    :param format: `ndjson` (one JSON object per line, the default) or `csv` with a header row.
+    :param gzip: Compress the stream on the fly and send it as a `.gz` file.
+    :return: a streaming response with a `Content-Disposition` attachment filename.
 """
 
 
-@app.get("/blogs/{blog_id}")
-def read_project(blog_id: int, session = Depends(get_session)):
-    blog = crud.get_single_blog(session=session, blog_id=blog_id)
+@app.get("/blogs/{blog_id}", response_model=schemas.BlogOut)
+async def read_blog(blog_id: int, format: str = Query("markdown", pattern="^(markdown|html)$"),
+                    session = Depends(get_read_session)):
+    if format == "html":
+        blog = await run_db(session, crud.get_blog_html, blog_id=blog_id)
+    else:
+        blog = await run_db(session, crud.get_single_blog, blog_id=blog_id)
     if blog is None:
         raise HTTPException(status_code=404, detail="Blog not found")
+    if format == "html":
+        return ORJSONResponse(schemas.BlogHtmlOut.model_validate(blog).model_dump(mode="json"))
     return blog
 """
     This endpoint reads a single blog post based on the provided blog ID.
@@ -284,7 +585,9 @@ def read_project(blog_id: int, session = Depends(get_session)):
     :param blog_id: The `blog_id` parameter in the code snippet represents the unique identifier of a
     blog. It is used to retrieve a specific blog from the database by its ID
     :type blog_id: int
-    :param session: The `session` parameter in the `read_project` function is a dependency that is
+    :param format: "markdown" (the default) returns the post as stored; "html" adds `content_html`,
+    the sanitized HTML rendered from the Markdown content when the post was last saved.
+    :param session: The `session` parameter in the `read_blog` function is a dependency that is
     obtained using the `Depends` function from. It is used to get a database session object that
     allows the function to interact with the database.
     :return: The code is returning a single blog post with the specified `blog_id`. If the blog post is
@@ -292,9 +595,9 @@ def read_project(blog_id: int, session = Depends(get_session)):
 """
 
 
-@app.put("/blogs/{blog_id}")
-def update_blog(blog_id: int, blog: schemas.Blog, session = Depends(get_session)):
-    updated_blog = crud.edit_blog(session=session, blog_id=blog_id, blog=blog)
+@app.put("/blogs/{blog_id}", dependencies=[Depends(require_owner)], response_model=schemas.BlogOut)
+async def update_blog(blog_id: int, blog: schemas.Blog, session = Depends(get_session)):
+    updated_blog = await run_write(session, crud.edit_blog, blog_id=blog_id, blog=blog)
     if updated_blog is None:
         raise HTTPException(status_code=404, detail="Blog not found")
     return updated_blog
@@ -318,9 +621,33 @@ def update_blog(blog_id: int, blog: schemas.Blog, session = Depends(get_session)
     message "Blog not found".
 """
 
-@app.delete("/blogs/{blog_id}")
-def delete_blog(blog_id: int, session = Depends(get_session)):
-    deleted_blog = crud.delete_blog(session=session, blog_id=blog_id)
+@app.patch("/blogs/{blog_id}", dependencies=[Depends(require_owner)], response_model=schemas.BlogOut)
+async def patch_blog(blog_id: int, blog: schemas.BlogUpdate, session = Depends(get_session)):
+    values = blog.model_dump(exclude_unset=True, exclude_none=True)
+    updated_blog = await run_write(session, crud.update_blog, blog_id, values)
+    if updated_blog is None:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    return updated_blog
+
+"""
+    This endpoint partially updates the blog with the specified ID.
+    
+    Only the fields present in the request body are changed; fields that are left out (or sent as
+    null) keep their current value. The change and the updated row are read back in a single
+    `UPDATE ... RETURNING` statement.
+    
+    :param blog_id: The unique identifier of the blog to update, taken from the URL path.
+    :type blog_id: int
+    :param blog: The fields to change, as a `schemas.BlogUpdate`.
+    :type blog: schemas.BlogUpdate
+    :return: the updated blog. If the blog is not found, it raises an HTTPException with a status
+    code of 404 and the detail message "Blog not found".
+"""
+
+
+@app.delete("/blogs/{blog_id}", dependencies=[Depends(require_owner)], response_model=schemas.BlogOut)
+async def delete_blog(blog_id: int, session = Depends(get_session)):
+    deleted_blog = await run_write(session, crud.delete_blog, blog_id=blog_id)
     if deleted_blog is None:
         raise HTTPException(status_code=404, detail="Blog not found")
     return deleted_blog
@@ -340,9 +667,9 @@ def delete_blog(blog_id: int, session = Depends(get_session)):
 """
 
 
-@app.delete("/blogs/")
-def delete_all_blogs(session = Depends(get_session)):
-    crud.delete_all_blogs(session=session)
+@app.delete("/blogs/", dependencies=[Depends(require_owner)])
+async def delete_all_blogs(session = Depends(get_session)):
+    await run_write(session, crud.delete_all_blogs)
     return {"detail": "All blogs deleted"}
 """
     This function deletes all blogs from the database.
@@ -355,9 +682,9 @@ def delete_all_blogs(session = Depends(get_session)):
 
 #contact information
 
-@app.post("/contacts/")
-def create_contact(contact: schemas.Contact_Info, session = Depends(get_session)):
-    return crud.create_contact(session=session, contact=contact)
+@app.post("/contacts/", dependencies=[Depends(require_owner)], response_model=schemas.Contact_InfoOut)
+async def create_contact(contact: schemas.Contact_Info, session = Depends(get_session)):
+    return await run_write(session, crud.create_contact, contact=contact)
 """
     This endpoint creates a new contact using the provided contact information in the database.
     
@@ -374,9 +701,31 @@ def create_contact(contact: schemas.Contact_Info, session = Depends(get_session)
 """
 
 
-@app.put("/contacts/{contact_id}")
-def update_contact(contact_id: int, contact: schemas.Contact_Info, session = Depends(get_session)):
-    updated_contact = crud.edit_contact(session=session, contact_id=contact_id, contact=contact)
+@app.post("/contacts/bulk", dependencies=[Depends(require_owner)], response_model=schemas.BulkResult)
+async def create_contacts_bulk(request: Request, upsert_on: str = None,
+                               session = Depends(get_session)):
+    try:
+        return await bulk_import(request, session, schemas.Contact_Info, models.Contact_Info, "contacts",
+                                 upsert_on)
+    except (ValueError, BulkFormatError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+"""
+    This endpoint creates many contacts in one request.
+    
+    The body is either a JSON array of contacts or, with a `Content-Type` of `application/x-ndjson`,
+    one contact per line, which is read as a stream. Every item is validated like a single create,
+    and valid rows are written in batched transactions.
+    
+    :param upsert_on: Optionally `email`. Rows whose value for that column already exists
+    update the existing row instead of inserting a new one.
+    :return: a dictionary with the number of rows "inserted" and "updated", and "errors", a list of
+    the indexes of items that were not saved and why. Invalid items do not stop the rest of the batch.
+"""
+
+@app.put("/contacts/{contact_id}", dependencies=[Depends(require_owner)], response_model=schemas.Contact_InfoOut)
+async def update_contact(contact_id: int, contact: schemas.Contact_Info, session = Depends(get_session)):
+    updated_contact = await run_write(session, crud.edit_contact, contact_id=contact_id, contact=contact)
     if updated_contact is None:
         raise HTTPException(status_code=404, detail="Contact Info not found")
     return updated_contact
@@ -403,9 +752,33 @@ def update_contact(contact_id: int, contact: schemas.Contact_Info, session = Dep
 
 
 
-@app.delete("/contacts/{contact_id}")
-def delete_contact(contact_id: int, session = Depends(get_session)):
-    deleted_contact = crud.delete_contact(session=session, contact_id=contact_id)
+@app.patch("/contacts/{contact_id}", dependencies=[Depends(require_owner)], response_model=schemas.Contact_InfoOut)
+async def patch_contact(contact_id: int, contact: schemas.Contact_InfoUpdate, session = Depends(get_session)):
+    values = contact.model_dump(exclude_unset=True, exclude_none=True)
+    updated_contact = await run_write(session, crud.update_contact, contact_id, values)
+    if updated_contact is None:
+        raise HTTPException(status_code=404, detail="Contact Info not found")
+    return updated_contact
+
+"""
+    This endpoint partially updates the contact with the specified ID.
+    
+    Only the fields present in the request body are changed; fields that are left out (or sent as
+    null) keep their current value. The change and the updated row are read back in a single
+    `UPDATE ... RETURNING` statement.
+    
+    :param contact_id: The unique identifier of the contact to update, taken from the URL path.
+    :type contact_id: int
+    :param contact: The fields to change, as a `schemas.Contact_InfoUpdate`.
+    :type contact: schemas.Contact_InfoUpdate
+    :return: the updated contact. If the contact is not found, it raises an HTTPException with a status
+    code of 404 and the detail message "Contact Info not found".
+"""
+
+
+@app.delete("/contacts/{contact_id}", dependencies=[Depends(require_owner)], response_model=schemas.Contact_InfoOut)
+async def delete_contact(contact_id: int, session = Depends(get_session)):
+    deleted_contact = await run_write(session, crud.delete_contact, contact_id=contact_id)
     if deleted_contact is None:
         raise HTTPException(status_code=404, detail="Contact info not found")
     return deleted_contact
@@ -423,4 +796,60 @@ def delete_contact(contact_id: int, session = Depends(get_session)):
     :return: the deleted contact information. If the contact with the specified contact_id is not found
     in the database, it will raise an HTTPException with a status code of 404 and the detail message
     "Contact info not found".
-"""
\ No newline at end of file
+"""
+
+#portfolio
+
+@app.get("/portfolio", response_model=schemas.Portfolio)
+async def read_portfolio(request: Request):
+    document = portfolio_snapshot.get()
+    if document is None:
+        document = await run_in_threadpool(portfolio_snapshot.rebuild)
+    encoding, body, etag, _ = await encode_entry(document, request.headers.get("accept-encoding", ""))
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match.encode() if if_none_match else None, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {k.decode(): v.decode() for k, v in response_headers(document, encoding, etag)}
+    return Response(body, headers=headers)
+"""
+    This endpoint returns everything the portfolio front page shows in one document: all projects,
+    summaries of the newest published blogs and all contact information.
+    
+    The document is kept materialized in memory. Writes to projects, blogs or contacts only mark
+    their section stale, and the next request reloads just that section, so most requests never
+    touch the database.
+    
+    :return: a dictionary with "projects", "blogs" (the same fields as the blog summary view, newest
+    first) and "contacts". The response carries an `ETag` and answers a matching `If-None-Match`
+    with 304. It is compressed like the cached projects and blogs responses.
+"""
+
+
+#changes
+
+CHANGE_SCHEMAS = {"projects": schemas.ProjectOut, "blogs": schemas.BlogOut, "contacts": schemas.Contact_InfoOut}
+
+
+@app.get("/changes", response_model=schemas.ChangePage)
+async def read_changes(since: int = Query(0, ge=0), limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                       session = Depends(get_read_session)):
+    changes, has_more = await run_db(session, crud.get_changes, since=since, limit=limit)
+    for change in changes:
+        if change.get("data") is not None:
+            change["data"] = CHANGE_SCHEMAS[change["entity"]].model_validate(change["data"]).model_dump()
+    next_cursor = changes[-1]["seq"] if changes else since
+    return {"changes": changes, "next_cursor": next_cursor, "has_more": has_more}
+"""
+    This endpoint returns the projects, blogs and contacts changed after a cursor, so a consumer can
+    stay in sync without refetching every list.
+    
+    :param since: the `next_cursor` of the previous response; 0 (the default) starts from the
+    beginning of the log.
+    :param limit: the maximum number of changes to return.
+    :param session: a read-only database session from `get_read_session`.
+    :return: a dictionary with "changes", oldest first, "next_cursor" to pass as `since` next time and
+    "has_more", which is true while further changes are already waiting. Each change has the entity
+    ("projects", "blogs" or "contacts"), the row `id`, `op` ("upsert" or "delete", a tombstone) and
+    `changed_at`. Upserts carry the row as it is now under "data". Only a row's latest change is
+    kept, so each row appears at most once however often it was written.
+"""